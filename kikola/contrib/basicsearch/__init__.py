@@ -28,11 +28,129 @@ Installation
 
 .. _below: `SEARCH_MODELS`_
 
+Structured filters
+==================
+
+Besides free text, search query could contain structured filters in
+``name<operator>value`` format, e.g. ``duration>1:30 month:2011-05 laptop``.
+Supported operators are ``:`` and ``=`` (exact match), ``<``, ``<=``, ``>``
+and ``>=``. Filter names are set up by ``filters`` option of each model in
+``SEARCH_MODELS``.
+
+Filters are parsed once per query and turned into database lookups, which
+narrow objects before matching free text remainder of query. Values for
+``kikola.db.fields.TimeDeltaField`` loaded by ``kikola.utils.str_to_timedelta``,
+for ``kikola.db.fields.MonthField`` expected in ``YYYY-MM`` format, and
+converted by field ``to_python`` method for other fields. Models without some
+of query filters or with wrong filter values are skipped.
+
+Facets
+======
+
+While searching ``basicsearch`` counts found objects for each model and, for
+fields set up by ``facets`` model option, for each value of these fields. All
+counts are calculated in same pass over found objects, without additional
+queries, and available in ``search_facets`` template var as list of dicts
+(in model priority order)::
+
+    [{'count': 34,
+      'fields': {'is_published': [(u'True', 30), (u'False', 4)]},
+      'model': 'flatpages.FlatPage',
+      'name': u'flat pages'}]
+
+Field values are sorted by number of found objects. With enabled search index
+facet values are stored in search entries.
+
+Batch search
+============
+
+To evaluate many search queries in one request, send them as JSON list to
+``basicsearch_batch`` url (``batch/`` in ``kikola.contrib.basicsearch.urls``)
+in POST body::
+
+    ["laptop", {"query": "bag", "page": 2, "per_page": 5}]
+
+or as several ``query`` GET params (``?query=laptop&query=bag``). Searchable
+models are resolved once for all queries. Response is JSON list with
+``count``, ``error``, ``facets``, ``page``, ``pages_count``, ``partial``,
+``query`` and ``results`` (list of ``title``, ``link`` and ``description``)
+for each query.
+
+Search index
+============
+
+By default ``basicsearch`` runs ``icontains`` lookups over all searchable
+fields of each model and renders ``title``, ``link`` and ``description`` of
+found objects on every search request.
+
+With enabled ``SEARCH_INDEX`` setting or ``index`` model option, lowered
+values of searchable fields and prerendered ``title``, ``link`` and
+``description`` of each object are stored in ``SearchEntry`` model on object
+saving. Search requests then query only search entries and fill results page
+without loading model instances. To use search index, add
+``django.contrib.contenttypes`` to ``INSTALLED_APPS``, run ``syncdb`` and index
+existing objects with::
+
+    $ python manage.py rebuild_search_index
+
+Search entries of objects deleted without sending signals (e.g. by raw SQL)
+and of models, which aren't indexed anymore, are stale. To remove them run::
+
+    $ python manage.py compact_search_index
+
+or start compaction in background thread, e.g. in your project's
+``ROOT_URLCONF`` module::
+
+    from kikola.contrib.basicsearch.compaction import start_compaction_thread
+
+
+    start_compaction_thread(interval=3600)
+
+Compaction checks and removes stale entries by small batches (see
+``SEARCH_COMPACTION_BATCH_SIZE``), each in its own transaction, so search
+requests aren't blocked while it runs.
+
+Note, that search index supports only models with integer primary keys and
+model ``trigger`` is checked only on object saving.
+
 Configuration
 =============
 
 You can customize ``basicsearch`` application by next setting vars
 
+SEARCH_ATTACH_OBJECTS
+---------------------
+
+Attach lazy loaded ``obj`` to results found over search index, so templates
+still could use it. Object is loaded from database only when template
+accesses it. By default: ``True``.
+
+SEARCH_BATCH_MAX_QUERIES
+------------------------
+
+Maximal number of queries in one batch search request (see `Batch search`_
+above). By default: 50.
+
+SEARCH_COMPACTION_BATCH_SIZE
+----------------------------
+
+Number of search entries to check and remove in one search index compaction
+transaction. By default: 500.
+
+SEARCH_COMPACTION_INTERVAL
+--------------------------
+
+Number of seconds between search index compactions in background thread. By
+default: 3600.
+
+SEARCH_DATABASE
+---------------
+
+Database alias to run search queries against, e.g. ``'replica'``, to move
+search off the primary database. Could be overwritten for each model by
+``database`` option in ``SEARCH_MODELS``. Requires Django 1.2 or higher. By
+default: ``None`` (database is selected by ``DATABASE_ROUTERS``).
+
 SEARCH_FORM
 -----------
 
@@ -40,6 +158,13 @@ Full path to default ``SearchForm`` class.
 
 By default uses ``kikola.contrib.basicsearch.forms.SearchForm`` class.
 
+SEARCH_INDEX
+------------
+
+Store objects of all searchable models in search index (see `Search index`_
+above). Could be overwritten for each model by ``index`` option in
+``SEARCH_MODELS``. By default: ``False``.
+
 SEARCH_MODELS
 -------------
 
@@ -49,12 +174,38 @@ Django's FlatPages use next config::
     SEARCH_MODELS = {
         # Use same format as ``app_label`` in serialized data
         'flatpages.FlatPage': {
+            # Database alias to search objects in (by default
+            # ``SEARCH_DATABASE`` used)
+            'database': None,
+
             # Object description in search results
             'description': '{{ obj.content|truncatewords_html:20 }}',
 
-            # Object fields to search
+            # Low-cardinality object fields to count found objects by their
+            # values (see `Facets`_ below)
+            'facets': ('is_published', ),
+
+            # Object fields to search. Values of ``kikola.db.fields.JSONField``
+            # could be searched by JSON paths, e.g. ``'attrs.color'`` searches
+            # over ``color`` key of ``attrs`` dict and ``'tags[]'`` over all
+            # items of ``tags`` list. With enabled ``index`` only values found
+            # by path are stored in search index, so search never touches raw
+            # JSON. Without index the whole serialized JSON is searched in
+            # database first and found values are checked by path after.
+            # Non-ASCII chars are escaped in serialized JSON, so without
+            # index values with such chars are found only in lower, upper,
+            # capitalized or title case of query.
             'fields': ('title', 'content'),
 
+            # Store objects in search index (by default ``SEARCH_INDEX``
+            # used)
+            'index': False,
+
+            # Structured filters in search query. Keys are filter names in
+            # query, values are model fields to filter by (see `Structured
+            # filters`_ below)
+            'filters': {'created': 'created_month'},
+
             # Use fulltext search (use this only when
             # ``settings.DATABASE_ENGINE == 'mysql'``)
             'fulltext': False,
@@ -95,6 +246,35 @@ SEARCH_QUERY_MAX_LENGTH
 
 Maximal length of search query. By default: 64.
 
+SEARCH_REFINE
+-------------
+
+Refine results of previous search query in memory when user continues to type
+it (e.g. ``lapt`` -> ``lapto`` -> ``laptop``), instead of running model
+queries against database again. Previous results are stored in cache per
+session, so this option requires enabled session middleware. Models with
+``fulltext`` search or with related fields lookups (``author__name``) are
+always searched in database. By default: ``False``.
+
+SEARCH_REFINE_MAX_CANDIDATES
+----------------------------
+
+Maximal number of found objects per model, which stored in cache for further
+refinement. If model query returns more objects, they wouldn't be refined on
+next query. By default: 1000.
+
+SEARCH_REFINE_TIMEOUT
+---------------------
+
+Number of seconds to keep found objects in cache for further refinement. By
+default: 300.
+
+SEARCH_RESULTS_MAX_PER_PAGE
+---------------------------
+
+Maximal number of search results on one page, which could be requested by
+``per_page`` param. By default: 100.
+
 SEARCH_RESULTS_PER_PAGE
 -----------------------
 
@@ -106,4 +286,12 @@ SEARCH_TEMPLATE_NAME
 Template used for rendering search results. By default:
 ``basicsearch/search.html``.
 
+SEARCH_TIME_BUDGET
+------------------
+
+Maximal number of seconds to spend for searching over models. When budget
+exceeded, rest of models (in priority order) are skipped and results page is
+rendered with already found objects and ``search_partial`` context var set to
+``True``. By default: ``None`` (no limit).
+
 """
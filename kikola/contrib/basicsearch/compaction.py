@@ -0,0 +1,123 @@
+"""
+Compaction of search index.
+
+Search entries could become stale, when searchable objects deleted or model
+removed from ``SEARCH_MODELS`` without sending signals (e.g. by raw SQL).
+Compaction removes such entries in small batches, each in its own short
+transaction, so search requests are never blocked by it.
+"""
+
+import logging
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from models import SearchEntry, is_indexed
+from settings import *
+from utils import *
+
+
+__all__ = ('CompactionThread', 'compact_search_index',
+           'start_compaction_thread')
+
+
+logger = logging.getLogger('kikola.contrib.basicsearch')
+
+
+def compact_search_index(batch_size=None):
+    """
+    Remove stale search entries and return number of removed entries.
+    """
+    batch_size = batch_size or SEARCH_COMPACTION_BATCH_SIZE
+    counter = 0
+
+    content_types = {}
+
+    for model_name, model, options in get_search_models():
+        if is_indexed(options):
+            content_type = ContentType.objects.get_for_model(model)
+            content_types[content_type.pk] = model
+
+    # Entries of models, which aren't indexed anymore
+    stale = SearchEntry.objects.exclude(content_type__in=content_types.keys())
+    counter += delete_entries(stale.values_list('pk', flat=True), batch_size)
+
+    # Entries of objects, which were deleted without sending signals
+    for content_type_id, model in content_types.items():
+        entries = SearchEntry.objects.filter(content_type=content_type_id).\
+            order_by('pk').values_list('pk', 'object_id')
+        last_pk = 0
+
+        while True:
+            batch = list(entries.filter(pk__gt=last_pk)[:batch_size])
+
+            if not batch:
+                break
+
+            last_pk = batch[-1][0]
+            existed = set(model.objects.\
+                          filter(pk__in=[item[1] for item in batch]).\
+                          values_list('pk', flat=True))
+            counter += delete_entries([pk for pk, object_id in batch \
+                                       if not object_id in existed],
+                                      batch_size)
+
+    return counter
+
+
+def delete_entries(pks, batch_size):
+    """
+    Delete search entries with given ``pks`` by batches, commit after each of
+    them.
+    """
+    pks, counter = list(pks), 0
+
+    for i in range(0, len(pks), batch_size):
+        batch = pks[i:i + batch_size]
+        SearchEntry.objects.filter(pk__in=batch).delete()
+        transaction.commit_unless_managed()
+        counter += len(batch)
+
+    return counter
+
+
+class CompactionThread(threading.Thread):
+    """
+    Daemon thread, which compacts search index every ``interval`` seconds
+    until stopped.
+    """
+    def __init__(self, interval=None, batch_size=None):
+        super(CompactionThread, self).__init__()
+        self.setDaemon(True)
+
+        self.batch_size = batch_size
+        self.interval = interval or SEARCH_COMPACTION_INTERVAL
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.stopped.wait(self.interval)
+
+            if self.stopped.isSet():
+                break
+
+            try:
+                counter = compact_search_index(self.batch_size)
+                logger.info('%d stale search entries removed', counter)
+            except Exception:
+                logger.exception('Cannot compact search index')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_compaction_thread(interval=None, batch_size=None):
+    """
+    Start ``CompactionThread`` and return it.
+    """
+    thread = CompactionThread(interval, batch_size)
+    thread.start()
+    return thread
@@ -1,11 +1,22 @@
+import hashlib
+import time
+
 from django import forms
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.paginator import InvalidPage, Paginator
-from django.db.models import Q, get_model
-from django.template import Context, Template
+from django.db.models import Q
+from django.db.models.sql.constants import LOOKUP_SEP
+from django.utils.encoding import force_unicode, smart_str
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import ugettext as _
 
+from kikola.utils import force_int, jsonlib
+
+from models import SearchEntry, is_indexed
 from settings import *
+from utils import *
 
 
 __all__ = ('SearchForm', )
@@ -22,81 +33,285 @@ class SearchForm(forms.Form):
         self.request = kwargs.pop('request')
         super(SearchForm, self).__init__(*args, **kwargs)
 
-    def search(self):
-        page = self.request.REQUEST.get('page', 1)
-        per_page = self.request.REQUEST.get('per_page',
-                                            SEARCH_RESULTS_PER_PAGE)
+    def get_refine_key(self):
+        """
+        Return cache key to store found objects for further refinement or
+        ``None`` if request doesn't have session yet.
+        """
+        session_key = self.request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+        if not session_key:
+            return None
+
+        # Session key is secret, so it's never stored in cache as is
+        return 'basicsearch:refine:%s' % \
+               hashlib.md5(smart_str(session_key)).hexdigest()
+
+    def get_refine_values(self, obj, fields):
+        """
+        Return lowered values of searchable ``fields`` from ``obj``.
+        """
+        return [get_field_value(obj, field) for field in fields]
+
+    def render_result(self, result):
+        """
+        Render found object or search index entry on current search page.
+        """
+        obj, options = result['obj'], result['options']
+
+        if not isinstance(obj, SearchEntry):
+            data = render_result(obj, options)
+            data.update({'obj': obj, 'priority': result['priority']})
+            return data
+
+        data = {'description': obj.description,
+                'link': obj.link,
+                'priority': obj.priority,
+                'title': obj.title}
+
+        if SEARCH_ATTACH_OBJECTS:
+            data['obj'] = SimpleLazyObject(obj.get_object)
+
+        return data
+
+    def search(self, page=None, per_page=None, search_models=None):
+        """
+        Search over all models and return dict with search results for
+        ``page`` (by default, taken from request).
+
+        Pass ``search_models`` (see ``get_search_models``) to reuse already
+        resolved searchable models between several searches.
+        """
+        page = force_int(page or self.request.REQUEST.get('page'), 1)
+        per_page = force_int(per_page or self.request.REQUEST.get('per_page'),
+                             SEARCH_RESULTS_PER_PAGE)
+        per_page = max(1, min(per_page, SEARCH_RESULTS_MAX_PER_PAGE))
         query = self.cleaned_data['query']
         search_results = []
 
         result_dict = {'search_query': query}
 
-        for model_name, options in SEARCH_MODELS.items():
-            assert 'fields' in options, \
-                   'Please, set up fields options for "%s".' % modelname
+        if search_models is None:
+            search_models = get_search_models()
+
+        # Parse structured filters (``duration>1:30``) from query only once
+        filter_names = set()
+
+        for model_name, model, options in search_models:
+            filter_names.update(options.get('filters', {}).keys())
+
+        text, filters = parse_query(query, filter_names)
 
-            app_label, model_name = model_name.split('.')
-            model = get_model(app_label, model_name)
+        # Load objects found by previous query, if current query extends it
+        lowered_query = text.lower()
+        refine_key = SEARCH_REFINE and self.get_refine_key() or None
+        refine_cache = refine_key and cache.get(refine_key) or None
 
-            description = options.get('description', False)
+        if refine_cache and \
+           (not refine_cache['query'] in lowered_query or \
+            refine_cache['filters'] != filters):
+            refine_cache = None
+
+        refined = {}
+
+        # Search over models with higher priority first, so they wouldn't be
+        # skipped if time budget exceeded
+        if SEARCH_TIME_BUDGET is not None:
+            deadline = time.time() + SEARCH_TIME_BUDGET
+        else:
+            deadline = None
+
+        facets, partial = [], False
+
+        for model_name, model, options in search_models:
+            if deadline is not None and time.time() > deadline:
+                partial = True
+                break
+
+            database = options.get('database', SEARCH_DATABASE)
             fields = options['fields']
             fulltext = options.get('fulltext', False)
-            link = options.get('link', False)
+            indexed = is_indexed(options)
             priority = options.get('priority', 0)
-            title = options.get('title', '{{ obj }}')
             trigger = options.get('trigger', None)
 
-            if fulltext and settings.DATABASE_ENGINE == 'mysql':
+            # Structured filters narrow objects before any text matching.
+            # Models, which couldn't be filtered, are skipped
+            filter_fields = options.get('filters', {})
+            filter_lookup = None
+
+            if [name for name, operator, value in filters \
+                if not name in filter_fields]:
+                continue
+
+            try:
+                for name, operator, value in filters:
+                    range_lookup = get_filter_lookup(model,
+                                                     filter_fields[name],
+                                                     operator,
+                                                     value)
+
+                    if filter_lookup is None:
+                        filter_lookup = range_lookup
+                    else:
+                        filter_lookup &= range_lookup
+            except ValueError:
+                continue
+
+            # Indexed objects are searched over lowered text of their search
+            # entries, triggers are already checked on indexing
+            if indexed:
+                fields, lookup, trigger = ('text', ), '%s__contains', None
+            elif fulltext and settings.DATABASE_ENGINE == 'mysql':
                 lookup = '%s__search'
             else:
                 lookup = '%s__icontains'
 
-            search_lookup = None
+            # Found objects could be refined in memory only for plain
+            # ``contains`` lookups over model fields
+            refinable = refine_key is not None and \
+                        lookup != '%s__search' and \
+                        not [field for field in fields if LOOKUP_SEP in field]
+
+            if refine_cache is not None:
+                candidates = refine_cache['models'].get(model_name)
+            else:
+                candidates = None
+
+            if refinable and candidates is not None:
+                candidates = [(obj, values) for obj, values in candidates \
+                              if [value for value in values \
+                                  if lowered_query in value]]
+                objects = [obj for obj, values in candidates]
+            else:
+                if indexed:
+                    content_type = ContentType.objects.get_for_model(model)
+                    queryset = SearchEntry.objects.\
+                        filter(content_type=content_type)
+
+                    if filter_lookup is not None:
+                        filtered = model.objects.filter(filter_lookup)
+
+                        if database is not None:
+                            filtered = filtered.using(database)
+
+                        queryset = queryset.\
+                            filter(object_id__in=filtered.values('pk'))
 
-            for field in fields:
-                if search_lookup is None:
-                    search_lookup = Q(**{lookup % field: query})
+                    if text:
+                        queryset = queryset.\
+                            filter(text__contains=lowered_query)
                 else:
-                    search_lookup |= Q(**{lookup % field: query})
+                    lookups, search_lookup = [], None
 
-            objects = model.objects.filter(search_lookup)
+                    # JSON paths are searched over whole serialized value of
+                    # their field and checked in memory after. Non-ASCII
+                    # chars are escaped in serialized JSON, so query is
+                    # escaped too, in common letter cases
+                    escaped = [jsonlib.dumps(value)[1:-1] \
+                               for value in (text, text.lower(), text.upper(),
+                                             text.capitalize(), text.title())]
 
-            if not objects:
-                continue
+                    for field in fields:
+                        if is_json_path(field):
+                            field = parse_json_path(field)[0]
+                            values = escaped
+                        else:
+                            values = (text, )
 
-            description_template = \
-                description and Template(description) or None
-            title_template = title and Template(title) or None
+                        for value in values:
+                            if (field, value) in lookups:
+                                continue
 
-            for obj in objects:
-                if trigger is not None and not trigger(obj):
-                    continue
+                            lookups.append((field, value))
 
-                context = Context({'obj': obj})
+                            if search_lookup is None:
+                                search_lookup = Q(**{lookup % field: value})
+                            else:
+                                search_lookup |= Q(**{lookup % field: value})
 
-                if description_template:
-                    obj_description = description_template.render(context)
-                else:
-                    obj_description = description
+                    queryset = model.objects.all()
 
-                if link_template:
-                    obj_link = link_template.render(context)
-                else:
-                    obj_link = obj.get_absolute_url()
+                    if filter_lookup is not None:
+                        queryset = queryset.filter(filter_lookup)
+
+                    if text:
+                        queryset = queryset.filter(search_lookup)
+
+                if database is not None:
+                    queryset = queryset.using(database)
 
-                if title_template:
-                    obj_title = title_template.render(context)
+                objects = list(queryset)
+
+                if not indexed and \
+                   [field for field in fields if is_json_path(field)]:
+                    objects = [obj for obj in objects \
+                               if [value for value in \
+                                   self.get_refine_values(obj, fields) \
+                                   if lowered_query in value]]
+
+                if refinable and \
+                   len(objects) <= SEARCH_REFINE_MAX_CANDIDATES:
+                    candidates = [(obj, self.get_refine_values(obj, fields)) \
+                                  for obj in objects]
                 else:
-                    obj_title = title
+                    candidates = None
+
+            if refinable and candidates is not None:
+                refined[model_name] = candidates
 
+            # Count found objects for model and its facet fields in same pass
+            facet = {'count': 0,
+                     'fields': dict([(field, {}) \
+                                     for field in options.get('facets', ())]),
+                     'model': model_name,
+                     'name': force_unicode(model._meta.verbose_name_plural)}
+
+            for obj in objects:
+                if deadline is not None and time.time() > deadline:
+                    partial = True
+                    break
+
+                if trigger is not None and not trigger(obj):
+                    continue
+
+                # Results are rendered later, only for current search page
                 search_results.append({
-                    'description': obj_description,
-                    'link': obj_link,
                     'obj': obj,
+                    'options': options,
                     'priority': priority,
-                    'title': obj_title,
                 })
 
+                facet['count'] += 1
+
+                for field, counter in facet['fields'].items():
+                    if isinstance(obj, SearchEntry):
+                        value = obj.facets.get(field)
+                    else:
+                        value = get_facet_value(obj, field)
+
+                    if value is not None:
+                        counter[value] = counter.get(value, 0) + 1
+
+            if facet['count']:
+                for field, counter in facet['fields'].items():
+                    facet['fields'][field] = \
+                        sorted(counter.items(),
+                               key=lambda item: (-item[1], item[0]))
+
+                facets.append(facet)
+
+        result_dict.update({'search_facets': facets,
+                            'search_partial': partial})
+
+        # Store found objects for refinement by next session query
+        if refine_key is not None:
+            cache.set(refine_key,
+                      {'filters': filters,
+                       'models': refined,
+                       'query': lowered_query},
+                      SEARCH_REFINE_TIMEOUT)
+
         if not search_results:
             result_dict.update(
                 {'search_error': SEARCH_NOT_FOUND_MESSAGE}
@@ -114,6 +329,8 @@ class SearchForm(forms.Form):
             )
             return result_dict
 
+        page_obj.object_list = map(self.render_result, page_obj.object_list)
+
         result_dict.update({
             'search_paginator': paginator,
             'search_results': page_obj.object_list,
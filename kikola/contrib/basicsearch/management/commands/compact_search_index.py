@@ -0,0 +1,21 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from kikola.contrib.basicsearch.compaction import compact_search_index
+
+
+class Command(NoArgsCommand):
+    help = 'Remove stale entries from search index.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', action='store', dest='batch_size',
+                    type='int', default=None,
+                    help='Number of entries to remove in one transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        counter = compact_search_index(options.get('batch_size'))
+
+        if verbosity:
+            self.stdout.write('%d stale search entries removed\n' % counter)
@@ -0,0 +1,38 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.db.models import get_model
+
+from kikola.contrib.basicsearch.models import SearchEntry, is_indexed
+from kikola.contrib.basicsearch.settings import SEARCH_MODELS
+
+
+class Command(NoArgsCommand):
+    help = 'Rebuild search index for all models with enabled "index" option.'
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        for model_name, model_options in SEARCH_MODELS.items():
+            if not is_indexed(model_options):
+                continue
+
+            app_label, model_name_part = model_name.split('.')
+            model = get_model(app_label, model_name_part)
+
+            counter = 0
+
+            for obj in model.objects.iterator():
+                SearchEntry.objects.index(obj, model_options)
+                counter += 1
+
+            # Remove entries of objects deleted without sending signals
+            content_type = ContentType.objects.get_for_model(model)
+            SearchEntry.objects.filter(content_type=content_type).\
+                exclude(object_id__in=model.objects.values('pk')).delete()
+
+            transaction.commit_unless_managed()
+
+            if verbosity:
+                self.stdout.write('%s: %d objects indexed\n' % \
+                                  (model_name, counter))
@@ -0,0 +1,132 @@
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import ugettext_lazy as _
+
+from kikola.db.fields import JSONField
+
+from settings import *
+from utils import *
+
+
+__all__ = ('SearchEntry', )
+
+
+logger = logging.getLogger('kikola.contrib.basicsearch')
+
+
+class SearchEntryManager(models.Manager):
+    """
+    Manager to keep search index entries in sync with searchable objects.
+    """
+    def index(self, obj, options=None):
+        """
+        Store search entry for ``obj`` with prerendered result payload. If
+        ``obj`` doesn't pass model ``trigger`` its entry would be removed.
+        """
+        options = options or get_model_options(type(obj))
+        trigger = options.get('trigger', None)
+
+        if trigger is not None and not trigger(obj):
+            self.unindex(obj)
+            return None
+
+        content_type = ContentType.objects.get_for_model(obj)
+        text = u'\n'.join([get_field_value(obj, field) \
+                           for field in options['fields']])
+
+        facets = {}
+
+        for field in options.get('facets', ()):
+            facets[field] = get_facet_value(obj, field)
+
+        data = render_result(obj, options)
+        data.update({'description': data['description'] or u'',
+                     'facets': facets,
+                     'priority': options.get('priority', 0),
+                     'text': text,
+                     'title': data['title'] or u''})
+
+        entries = self.filter(content_type=content_type, object_id=obj.pk)
+
+        if not entries.update(**data):
+            self.create(content_type=content_type, object_id=obj.pk, **data)
+
+    def unindex(self, obj):
+        """
+        Remove search entry for ``obj``.
+        """
+        content_type = ContentType.objects.get_for_model(obj)
+        self.filter(content_type=content_type, object_id=obj.pk).delete()
+
+
+class SearchEntry(models.Model):
+    """
+    Search index entry with prerendered result payload for searchable object.
+    """
+    content_type = models.ForeignKey(ContentType,
+                                     verbose_name=_('content type'))
+    object_id = models.PositiveIntegerField(_('object id'))
+
+    description = models.TextField(_('description'), blank=True)
+    facets = JSONField(_('facets'), blank=True, default={})
+    link = models.TextField(_('link'))
+    priority = models.IntegerField(_('priority'), default=0)
+    text = models.TextField(_('text'))
+    title = models.TextField(_('title'))
+
+    objects = SearchEntryManager()
+
+    class Meta:
+        ordering = ('-priority', 'title')
+        unique_together = ('content_type', 'object_id')
+        verbose_name = _('search entry')
+        verbose_name_plural = _('search entries')
+
+    def __unicode__(self):
+        return self.title
+
+    def get_object(self):
+        """
+        Load indexed object from database.
+        """
+        content_type = ContentType.objects.get_for_id(self.content_type_id)
+        return content_type.get_object_for_this_type(pk=self.object_id)
+
+
+def is_indexed(options):
+    """
+    Check that objects of model with ``options`` should be stored in search
+    index.
+    """
+    return options is not None and options.get('index', SEARCH_INDEX)
+
+
+def delete_search_entry(sender, instance, **kwargs):
+    if is_indexed(get_model_options(sender)):
+        SearchEntry.objects.unindex(instance)
+
+
+def update_search_entry(sender, instance, raw=False, **kwargs):
+    # Do not index objects loaded from fixtures, run ``rebuild_search_index``
+    # management command instead
+    if raw:
+        return
+
+    options = get_model_options(sender)
+
+    if not is_indexed(options):
+        return
+
+    # Wrong search options (e.g. missed ``get_absolute_url`` method) should
+    # not break saving of objects
+    try:
+        SearchEntry.objects.index(instance, options)
+    except Exception:
+        logger.exception('Cannot index %r object', instance)
+
+
+post_delete.connect(delete_search_entry)
+post_save.connect(update_search_entry)
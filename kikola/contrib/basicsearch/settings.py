@@ -2,15 +2,43 @@ from django.conf import settings
 from django.utils.translation import ugettext as _
 
 
-__all__ = ('SEARCH_FORM', 'SEARCH_MODELS', 'SEARCH_QUERY_MIN_LENGTH',
-           'SEARCH_QUERY_MAX_LENGTH', 'SEARCH_RESULTS_PER_PAGE')
+__all__ = ('SEARCH_ATTACH_OBJECTS', 'SEARCH_BATCH_MAX_QUERIES',
+           'SEARCH_COMPACTION_BATCH_SIZE', 'SEARCH_COMPACTION_INTERVAL',
+           'SEARCH_DATABASE', 'SEARCH_FORM', 'SEARCH_INDEX', 'SEARCH_MODELS',
+           'SEARCH_NOT_FOUND_MESSAGE', 'SEARCH_QUERY_MIN_LENGTH',
+           'SEARCH_QUERY_MAX_LENGTH', 'SEARCH_REFINE',
+           'SEARCH_REFINE_MAX_CANDIDATES', 'SEARCH_REFINE_TIMEOUT',
+           'SEARCH_RESULTS_MAX_PER_PAGE', 'SEARCH_RESULTS_PER_PAGE',
+           'SEARCH_TEMPLATE_NAME', 'SEARCH_TIME_BUDGET')
 
 
+# Attach lazy loaded objects to results found over search index
+SEARCH_ATTACH_OBJECTS = getattr(settings, 'SEARCH_ATTACH_OBJECTS', True)
+
+# Maximal number of queries in one batch search request
+SEARCH_BATCH_MAX_QUERIES = getattr(settings, 'SEARCH_BATCH_MAX_QUERIES', 50)
+
+# Number of search entries to check and remove in one compaction transaction
+SEARCH_COMPACTION_BATCH_SIZE = getattr(settings,
+                                       'SEARCH_COMPACTION_BATCH_SIZE',
+                                       500)
+
+# Number of seconds between search index compactions in background thread
+SEARCH_COMPACTION_INTERVAL = getattr(settings,
+                                     'SEARCH_COMPACTION_INTERVAL',
+                                     3600)
+
+# Database alias to run search queries against
+SEARCH_DATABASE = getattr(settings, 'SEARCH_DATABASE', None)
+
 # Full path to default ``SearchForm`` class
 SEARCH_FORM = getattr(settings,
                       'SEARCH_FORM',
                       'kikola.contrib.basicsearch.forms.SearchForm')
 
+# Store searchable objects in search index by default
+SEARCH_INDEX = getattr(settings, 'SEARCH_INDEX', False)
+
 # Sets up models for searching
 SEARCH_MODELS = getattr(settings, 'SEARCH_MODELS', {})
 
@@ -25,6 +53,23 @@ SEARCH_QUERY_MIN_LENGTH = getattr(settings, 'SEARCH_QUERY_MIN_LENGTH', 3)
 # Maximal length of search query
 SEARCH_QUERY_MAX_LENGTH = getattr(settings, 'SEARCH_QUERY_MAX_LENGTH', 64)
 
+# Refine search results of previous session query in memory, when new query
+# extends it
+SEARCH_REFINE = getattr(settings, 'SEARCH_REFINE', False)
+
+# Maximal number of objects per model stored for further refinement
+SEARCH_REFINE_MAX_CANDIDATES = getattr(settings,
+                                       'SEARCH_REFINE_MAX_CANDIDATES',
+                                       1000)
+
+# Number of seconds to store objects for further refinement
+SEARCH_REFINE_TIMEOUT = getattr(settings, 'SEARCH_REFINE_TIMEOUT', 300)
+
+# Maximal number of search results, which could be requested for one page
+SEARCH_RESULTS_MAX_PER_PAGE = getattr(settings,
+                                      'SEARCH_RESULTS_MAX_PER_PAGE',
+                                      100)
+
 # Number of search results, rendering at search page
 SEARCH_RESULTS_PER_PAGE = getattr(settings, 'SEARCH_RESULTS_PER_PAGE', 10)
 
@@ -32,3 +77,6 @@ SEARCH_RESULTS_PER_PAGE = getattr(settings, 'SEARCH_RESULTS_PER_PAGE', 10)
 SEARCH_TEMPLATE_NAME = getattr(settings,
                                'SEARCH_TEMPLATE_NAME',
                                'basicsearch/search.html')
+
+# Maximal number of seconds to spend for searching over models
+SEARCH_TIME_BUDGET = getattr(settings, 'SEARCH_TIME_BUDGET', None)
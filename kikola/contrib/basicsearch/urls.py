@@ -3,4 +3,5 @@ from django.conf.urls.defaults import *
 
 urlpatterns = patterns('kikola.contrib.basicsearch.views',
     url(r'^$', 'search', name='basicsearch'),
+    url(r'^batch/$', 'search_batch', name='basicsearch_batch'),
 )
@@ -1,3 +1,184 @@
+import datetime
+import re
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, get_model
+from django.db.models.sql.constants import LOOKUP_SEP
+from django.template import Context, Template
+from django.utils.encoding import force_unicode
+
+from kikola.core.decorators import memoized
+from kikola.db.fields import MonthField, TimeDeltaField
+from kikola.utils import str_to_timedelta
+
+from settings import *
+
+
+__all__ = ('compile_template', 'get_facet_value', 'get_field_value',
+           'get_filter_lookup', 'get_json_values', 'get_model_options',
+           'get_search_models', 'is_json_path', 'load_cls', 'parse_json_path',
+           'parse_query', 'render_result')
+
+
+FILTER_LOOKUPS = {
+    ':': 'exact',
+    '=': 'exact',
+    '<': 'lt',
+    '<=': 'lte',
+    '>': 'gt',
+    '>=': 'gte',
+}
+FILTER_RE = re.compile(r'^(?P<name>\w+)(?P<operator><=|>=|<|>|:|=)' \
+                       r'(?P<value>\S+)$')
+JSON_PATH_RE = re.compile(r'\[\]|[^.\[\]]+')
+MONTH_FORMAT = '%Y-%m'
+
+
+@memoized
+def compile_template(source):
+    """
+    Compile template from ``source`` string only once.
+    """
+    return Template(source)
+
+
+def get_facet_value(obj, field):
+    """
+    Return value of facet ``field`` from ``obj`` as unicode string or ``None``
+    if object doesn't have value for this field.
+    """
+    value = getattr(obj, field)
+    return value is not None and force_unicode(value) or None
+
+
+def get_field_value(obj, field):
+    """
+    Return lowered value of searchable ``field`` from ``obj``. Related lookups
+    (``author__name``) and JSON paths (``attrs.color``) are supported.
+    """
+    if is_json_path(field):
+        name, parts = parse_json_path(field)
+        values = get_json_values(getattr(obj, name), parts)
+        return u'\n'.join([force_unicode(value).lower() for value in values])
+
+    value = obj
+
+    for part in field.split(LOOKUP_SEP):
+        if value is None:
+            break
+        value = getattr(value, part)
+
+    return value is not None and force_unicode(value).lower() or u''
+
+
+def get_filter_lookup(model, field_name, operator, value):
+    """
+    Return ``Q`` lookup to filter ``model`` objects by ``field_name`` value
+    according to structured query filter, e.g. ``duration>1:30``.
+
+    String ``value`` is converted by field type: ``TimeDeltaField`` values
+    are loaded with ``str_to_timedelta``, ``MonthField`` values expected in
+    ``YYYY-MM`` format, other fields convert values by their ``to_python``
+    method. If value could not be converted ``ValueError`` would be raised.
+    """
+    field = model._meta.get_field(field_name)
+
+    if isinstance(field, TimeDeltaField):
+        converted = str_to_timedelta(value)
+    elif isinstance(field, MonthField):
+        converted = datetime.datetime.strptime(value, MONTH_FORMAT).date()
+    else:
+        try:
+            converted = field.to_python(value)
+        except ValidationError:
+            converted = None
+
+    if converted is None:
+        raise ValueError('Cannot convert %r to %s value.' % \
+                         (value, field.__class__.__name__))
+
+    lookup = '%s__%s' % (field_name, FILTER_LOOKUPS[operator])
+    return Q(**{lookup: converted})
+
+
+def get_json_values(value, parts):
+    """
+    Return all scalar values found by JSON path ``parts`` in ``value``. ``[]``
+    part means all items of list, other parts are dict keys.
+    """
+    values = [value]
+
+    for part in parts:
+        found = []
+
+        for value in values:
+            if part == '[]':
+                if isinstance(value, (list, tuple)):
+                    found.extend(value)
+            elif isinstance(value, dict) and part in value:
+                found.append(value[part])
+
+        values = found
+
+    # Flatten containers found by path to their scalar values
+    scalars = []
+
+    while values:
+        value = values.pop(0)
+
+        if isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            values.extend(value)
+        elif value is not None:
+            scalars.append(value)
+
+    return scalars
+
+
+def get_model_options(model):
+    """
+    Return ``SEARCH_MODELS`` options for ``model`` or ``None`` if model isn't
+    searchable.
+    """
+    opts = model._meta
+    name = ('%s.%s' % (opts.app_label, opts.object_name)).lower()
+
+    for model_name, options in SEARCH_MODELS.items():
+        if model_name.lower() == name:
+            return options
+
+    return None
+
+
+def get_search_models():
+    """
+    Return list of ``(model_name, model, options)`` tuples for all searchable
+    models. Models with higher priority go first.
+    """
+    search_models = []
+
+    for model_name, options in SEARCH_MODELS.items():
+        assert 'fields' in options, \
+               'Please, set up fields options for "%s".' % model_name
+
+        app_label, model_name_part = model_name.split('.')
+        model = get_model(app_label, model_name_part)
+        search_models.append((model_name, model, options))
+
+    search_models.sort(key=lambda item: item[2].get('priority', 0),
+                       reverse=True)
+    return search_models
+
+
+def is_json_path(field):
+    """
+    Check that searchable ``field`` is path inside of ``JSONField`` value, e.g.
+    ``attrs.color`` or ``tags[]``.
+    """
+    return '.' in field or '[]' in field
+
+
 def load_cls(name):
     module_name, cls_name = name.rsplit('.', 1)
 
@@ -8,3 +189,59 @@ def load_cls(name):
         module = getattr(module, part)
 
     return getattr(module, cls_name)
+
+
+def parse_json_path(field):
+    """
+    Split JSON path ``field`` into model field name and path parts, e.g.
+    ``attrs.sizes[].name`` to ``('attrs', ['sizes', '[]', 'name'])``.
+    """
+    parts = JSON_PATH_RE.findall(field)
+    return parts[0], parts[1:]
+
+
+def parse_query(query, names):
+    """
+    Split search ``query`` into free text and list of structured filters with
+    given ``names``, e.g. ``laptop duration>1:30`` to
+    ``(u'laptop', [('duration', '>', '1:30')])``.
+    """
+    filters, words = [], []
+
+    for word in query.split():
+        match = FILTER_RE.match(word)
+
+        if match is not None and match.group('name') in names:
+            filters.append(match.group('name', 'operator', 'value'))
+        else:
+            words.append(word)
+
+    if not filters:
+        return query, filters
+
+    return u' '.join(words), filters
+
+
+def render_result(obj, options):
+    """
+    Render ``description``, ``link`` and ``title`` of found ``obj`` according
+    to its model ``options``.
+    """
+    context = Context({'obj': obj})
+
+    description = options.get('description', False)
+    link = options.get('link', False)
+    title = options.get('title', '{{ obj }}')
+
+    if description:
+        description = compile_template(description).render(context)
+
+    if link:
+        link = compile_template(link).render(context)
+    else:
+        link = obj.get_absolute_url()
+
+    if title:
+        title = compile_template(title).render(context)
+
+    return {'description': description, 'link': link, 'title': title}
@@ -1,6 +1,15 @@
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 
+from kikola.core.decorators import render_to_json
+from kikola.utils import jsonlib
+
+# Batch search only reads data, so it doesn't need CSRF protection
+try:
+    from django.views.decorators.csrf import csrf_exempt
+except ImportError:
+    csrf_exempt = lambda func: func
+
 from settings import *
 from utils import *
 
@@ -19,3 +28,67 @@ def search(request):
 
     context.update({'form': form})
     return render_to_response(SEARCH_TEMPLATE_NAME, context)
+
+
+@csrf_exempt
+@render_to_json
+def search_batch(request):
+    """
+    Evaluate many search queries in one request and return JSON with results
+    for each of them.
+
+    Queries could be sent as JSON list in POST body, where each item is query
+    string or dict with ``query``, ``page`` and ``per_page`` keys, or as
+    several ``query`` GET params.
+    """
+    if request.method == 'POST':
+        try:
+            queries = jsonlib.loads(request.raw_post_data)
+        except ValueError:
+            return {'error': 'Please, supply JSON list of queries.'}
+    else:
+        queries = request.GET.getlist('query')
+
+    if not isinstance(queries, list):
+        return {'error': 'Please, supply JSON list of queries.'}
+
+    if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+        return {'error': 'Please, supply no more than %d queries.' % \
+                         SEARCH_BATCH_MAX_QUERIES}
+
+    form_cls = load_cls(SEARCH_FORM)
+    search_models = get_search_models()
+    output = []
+
+    for data in queries:
+        if not isinstance(data, dict):
+            data = {'query': data}
+
+        form = form_cls({'query': data.get('query')}, request=request)
+
+        if not form.is_valid():
+            output.append({'errors': form.errors, 'query': data.get('query')})
+            continue
+
+        result = form.search(data.get('page', 1),
+                             data.get('per_page', SEARCH_RESULTS_PER_PAGE),
+                             search_models)
+        item = {'count': result.get('search_count', 0),
+                'error': result.get('search_error'),
+                'facets': result['search_facets'],
+                'partial': result['search_partial'],
+                'query': result['search_query'],
+                'results': []}
+
+        if 'search_page' in result:
+            item.update({'page': result['search_page'].number,
+                         'pages_count': result['search_pages_count']})
+
+        for obj in result.get('search_results', []):
+            item['results'].append({'description': obj['description'],
+                                    'link': obj['link'],
+                                    'title': obj['title']})
+
+        output.append(item)
+
+    return output
@@ -1,3 +1,147 @@
+from UserDict import DictMixin
+
+from django.template import Context
+from django.template.context import get_standard_processors
+
+from kikola.shortcuts import conf
+
+
+__all__ = ('LazyRequestContext', 'path')
+
+
+# Keys of context variables added by Django context processors
+CONTEXT_KEYS = {
+    'django.contrib.auth.context_processors.auth': \
+        ('messages', 'perms', 'user'),
+    'django.contrib.messages.context_processors.messages': \
+        ('DEFAULT_MESSAGE_LEVELS', 'messages'),
+    'django.core.context_processors.auth': ('messages', 'perms', 'user'),
+    'django.core.context_processors.csrf': ('csrf_token', ),
+    'django.core.context_processors.debug': ('debug', 'sql_queries'),
+    'django.core.context_processors.i18n': \
+        ('LANGUAGES', 'LANGUAGE_BIDI', 'LANGUAGE_CODE'),
+    'django.core.context_processors.media': ('MEDIA_URL', ),
+    'django.core.context_processors.request': ('request', ),
+    'django.core.context_processors.static': ('STATIC_URL', ),
+}
+
+MISSING = object()
+
+
+def get_context_keys(processor):
+    """
+    Return keys of context variables added by context processor or ``None``
+    if they're unknown.
+    """
+    keys = getattr(processor, 'context_keys', None)
+
+    if keys is not None:
+        return keys
+
+    name = '%s.%s' % (processor.__module__, processor.__name__)
+    return conf('LAZY_CONTEXT_KEYS', {}).get(name, CONTEXT_KEYS.get(name))
+
+
+class LazyProcessors(DictMixin):
+    """
+    Dict-like object, which calls context processors only on first lookup of
+    variables they add.
+    """
+    def __init__(self, request, processors):
+        self.missing = set()
+        self.processors = [(processor, get_context_keys(processor)) \
+                           for processor in processors]
+        self.request = request
+        self.results = {}
+        self.values = {}
+
+    def __contains__(self, key):
+        return self.resolve(key) is not MISSING
+
+    def __getitem__(self, key):
+        value = self.resolve(key)
+
+        if value is MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __setitem__(self, key, value):
+        self.missing.discard(key)
+        self.values[key] = value
+
+    def evaluate(self, index):
+        """
+        Call context processor by its index, if it isn't called yet, and
+        return its result.
+        """
+        if not index in self.results:
+            processor = self.processors[index][0]
+            self.results[index] = processor(self.request)
+        return self.results[index]
+
+    has_key = __contains__
+
+    def keys(self):
+        for index in xrange(len(self.processors) - 1, -1, -1):
+            for key, value in self.evaluate(index).iteritems():
+                self.values.setdefault(key, value)
+        return self.values.keys()
+
+    def resolve(self, key):
+        """
+        Return value of context variable or ``MISSING``.
+
+        Processors, which add variable by their known keys, are checked from
+        last to first, same as ``RequestContext`` does, then processors with
+        unknown keys.
+        """
+        if key in self.values:
+            return self.values[key]
+
+        if key in self.missing:
+            return MISSING
+
+        indexes = xrange(len(self.processors) - 1, -1, -1)
+
+        for known in (True, False):
+            for index in indexes:
+                keys = self.processors[index][1]
+
+                if known != (keys is not None) or known and not key in keys:
+                    continue
+
+                result = self.evaluate(index)
+
+                if key in result:
+                    value = self.values[key] = result[key]
+                    return value
+
+        self.missing.add(key)
+        return MISSING
+
+
+class LazyRequestContext(Context):
+    """
+    ``RequestContext`` alternative, which calls context processors only when
+    template looks up one of variables they add.
+
+    Context processors declare keys of their variables by ``context_keys``
+    attribute or by ``LAZY_CONTEXT_KEYS`` setting (dict of context processor
+    paths and keys). Keys of Django context processors are known already.
+    Context processors with unknown keys are called on first lookup of
+    variable, which isn't added by view or other context processors, and
+    their variables don't overwrite variables with known keys.
+    """
+    def __init__(self, request, dict_=None, processors=None):
+        Context.__init__(self, dict_)
+        processors = get_standard_processors() + tuple(processors or ())
+        self.update(LazyProcessors(request, processors))
+
+
 def path(request):
     """
     Adds current absolute URI, path and full path variables to templates.
@@ -11,3 +155,6 @@ def path(request):
     return {'REQUEST_ABSOLUTE_URI': request.build_absolute_uri(),
             'REQUEST_FULL_PATH': request.get_full_path(),
             'REQUEST_PATH': request.path}
+
+path.context_keys = ('REQUEST_ABSOLUTE_URI', 'REQUEST_FULL_PATH',
+                     'REQUEST_PATH')
@@ -1,27 +1,613 @@
+import cProfile
 import datetime
-
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
+import hashlib
+import logging
+import math
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import types
+import warnings
+import weakref
 
 from functools import partial, wraps
 
 from django.conf import settings
-from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse
+from django.core.cache import get_cache
+from django.db import models
+from django.db.models.signals import post_save
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import render_to_response
 from django.template import RequestContext
-from django.template.defaultfilters import date as date_filter
+from django.utils.dateformat import DateFormat, re_escaped, re_formatchars
+from django.utils.encoding import force_unicode, smart_str
+from django.utils.cache import cc_delim_re, patch_vary_headers
+from django.utils.translation import get_language
+
+try:
+    from django.utils.http import parse_etags, quote_etag
+except ImportError:
+    # Django < 1.1 doesn't have ETag helpers
+    ETAG_MATCH = re.compile(r'(?:W/)?"((?:\\.|[^"])*)"')
+
+    def parse_etags(etag_str):
+        etags = ETAG_MATCH.findall(etag_str)
+        if not etags:
+            return [etag_str]
+        return [etag.decode('string_escape') for etag in etags]
+
+    def quote_etag(etag):
+        return '"%s"' % etag.replace('\\', '\\\\').replace('"', '\\"')
+
+try:
+    from django.utils.formats import get_format
+except ImportError:
+    # Django < 1.2 doesn't support localized formats
+    get_format = lambda format: format
+
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # Django < 1.5 streams content of ``HttpResponse`` from iterator
+    StreamingHttpResponse = HttpResponse
 
+from kikola.core.context_processors import LazyRequestContext
 from kikola.shortcuts import conf
+from kikola.utils import jsonlib, msgpacklib
 
 
-__all__ = ('memoized', 'render_to', 'render_to_json', 'smart_datetime')
+__all__ = ('cached_model_property', 'invalidate_cached_responses', 'memoized',
+           'profiled', 'render_to', 'render_to_json', 'shared_memoized',
+           'smart_datetime', 'smart_datetimes')
 
 
 TODAY = datetime.date.today
 
+logger = logging.getLogger('kikola.core.decorators')
+
+# Mimetypes of MessagePack responses
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Python 3.3+ has monotonic high resolution timer
+timer = getattr(time, 'perf_counter', time.time)
+
+# Lock to aggregate profiling stats of views
+PROFILE_LOCK = threading.Lock()
+
+# Current date and timestamp, when it ends
+TODAY_CACHE = [None, 0]
+
+# Cache key of version of cached responses tag
+RESPONSES_TAG_KEY = 'kikola:responses-tag:%s'
+
+# Items of ``memoized`` cache links and separator of keyword arguments in
+# cache keys
+PREV, NEXT, KEY, VALUE, EXPIRES = range(5)
+KWARGS_MARK = object()
+
+
+class Flight(object):
+    """
+    Computation of ``memoized`` value, which other threads could wait for.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.exc_info = self.value = None
+        self.thread = threading.currentThread()
+
+    def wait(self):
+        """
+        Wait until value is computed and return it or reraise exception.
+        """
+        self.done.wait()
+
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+        return self.value
+
+
+def accepts_msgpack(request):
+    """
+    Check that client accepts MessagePack responses. MessagePack should be
+    listed in ``Accept`` header explicitly with quality not lower than JSON
+    quality.
+    """
+    qualities = parse_accept(request.META.get('HTTP_ACCEPT', ''))
+
+    msgpack = max([qualities.get(mimetype, 0) \
+                   for mimetype in MSGPACK_MIMETYPES])
+    json = max([qualities.get(mimetype, 0) \
+                for mimetype in ('application/json', 'application/*', '*/*')])
+
+    return msgpack > 0 and msgpack >= json
+
+
+def cached_response(func, options, handled=()):
+    """
+    Store view responses to GET requests in Django cache.
+
+    ``options`` is ``True``, number of seconds to keep responses or dict with
+    next keys:
+
+    * ``alias`` - cache alias. By default: ``'default'``.
+    * ``params`` - names of GET params, which values change response.
+    * ``tags`` - tags to invalidate cached responses by
+      ``invalidate_cached_responses`` function.
+    * ``timeout`` - number of seconds to keep responses.
+    * ``vary`` - other inputs, which change response: ``'language'``,
+      ``'user'`` (is user authenticated or not), names of ``request.META``
+      keys or functions, which take request and return value.
+
+    Cache key is built from view name, view arguments and values of all
+    these inputs. Only responses with "200 OK" status and without cookies
+    are stored.
+
+    Responses of views, which use CSRF token, session or ``request.user``
+    (``SessionMiddleware`` adds ``Vary: Cookie`` to them later), and
+    responses with ``Cookie`` in ``Vary`` set by view are never stored.
+    For other headers in response ``Vary`` (except ``handled`` ones, which
+    values are already in cache key) cached response is used only if request
+    has same header values.
+    """
+    options = get_cache_options(options)
+    backend = get_cache(options.get('alias', 'default'))
+    params = options.get('params', ())
+    prefix = 'kikola:response:%s.%s' % (func.__module__, func.__name__)
+    tags = options.get('tags', ())
+    timeout = options.get('timeout')
+    vary = options.get('vary', ())
+
+    handled = set([header.lower() for header in handled])
+
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        if not request.method in ('GET', 'HEAD'):
+            return func(request, *args, **kwargs)
+
+        parts = [make_key_part(arg) for arg in args]
+        parts.extend(['%s=%s' % (name, make_key_part(value)) \
+                      for name, value in sorted(kwargs.items())])
+        parts.extend(['%s=%s' % (name,
+                                 make_key_part(request.GET.getlist(name))) \
+                      for name in params])
+        parts.extend([make_key_part(get_vary_value(request, item)) \
+                      for item in vary])
+        parts.extend(get_tags_versions(backend, tags))
+
+        key = '%s:%s' % (prefix, hashlib.md5('\n'.join(parts)).hexdigest())
+        cached = backend.get(key)
+
+        if cached is not None:
+            content, status, headers, varied = cached
+
+            if [value for name, value in varied \
+                if request.META.get(name) != value]:
+                cached = None
+
+        if cached is not None:
+            response = HttpResponse(content, status=status)
+
+            for header, value in headers:
+                response[header] = value
+
+            return response
+
+        # Session accessed for ``'user'`` vary is already covered by cache
+        # key, so check only session access by view
+        session = getattr(request, 'session', None)
+
+        if session is not None:
+            accessed, session.accessed = session.accessed, False
+
+        response = func(request, *args, **kwargs)
+
+        if session is not None:
+            used = session.accessed
+            session.accessed = used or accessed
+        else:
+            used = False
+
+        # CSRF token, session and cookies are different for each client
+        if response.status_code != 200 or response.cookies or used or \
+           request.META.get('CSRF_COOKIE_USED') or is_streaming(response):
+            return response
+
+        varied = []
+
+        if response.has_header('Vary'):
+            for header in cc_delim_re.split(response['Vary'].lower()):
+                if header in ('*', 'cookie'):
+                    return response
+                elif header and not header in handled:
+                    name = 'HTTP_' + header.upper().replace('-', '_')
+                    varied.append((name, request.META.get(name)))
+
+        # Timings of cached responses are different on each request
+        headers = [(header, value) for header, value in response.items() \
+                   if header.lower() != 'server-timing']
+        backend.set(key,
+                    (response.content, response.status_code, headers, varied),
+                    timeout)
+
+        return response
+    return wrapper
+
+
+def conditional(func, etag):
+    """
+    Add ``ETag`` header to view responses and answer to GET requests with
+    matched ``If-None-Match`` header by "304 Not Modified" response.
+
+    When ``etag`` is callable, it called with view arguments before the view
+    and should return version of view response (or ``None`` to skip checks),
+    so view isn't called at all for matched requests. Otherwise, ``ETag`` is
+    hash of rendered response content.
+    """
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        conditional = request.method in ('GET', 'HEAD')
+        value = None
+
+        if callable(etag):
+            version = etag(request, *args, **kwargs)
+
+            if version is not None:
+                value = quote_etag(smart_str(version))
+
+                if conditional and is_etag_matched(request, value):
+                    return not_modified(value)
+
+        response = func(request, *args, **kwargs)
+
+        if response.status_code != 200 or response.has_header('ETag'):
+            return response
+
+        if value is None and not callable(etag) and \
+           not is_streaming(response):
+            value = quote_etag(hashlib.md5(response.content).hexdigest())
+
+            if conditional and is_etag_matched(request, value):
+                return not_modified(value)
+
+        if value is not None:
+            response['ETag'] = value
+
+        return response
+    return wrapper
+
+
+def get_negotiated_etag(etag):
+    """
+    Add format of response, negotiated by ``Accept`` header, to ``etag``
+    function, so JSON and MessagePack responses never have same ``ETag``.
+    """
+    def wrapper(request, *args, **kwargs):
+        version = etag(request, *args, **kwargs)
+
+        if version is not None and accepts_msgpack(request):
+            return '%s-msgpack' % smart_str(version)
+
+        return version
+    return wrapper
+
+
+def get_cache_options(options):
+    """
+    Convert ``cache`` option of ``render_to`` decorators to dict.
+    """
+    if not isinstance(options, dict):
+        options = {'timeout': options is not True and options or None}
+    return options
+
+
+def get_tags_versions(backend, tags):
+    """
+    Return current versions of cached responses tags. Missed versions are
+    started from current time, so responses cached with evicted versions are
+    never used.
+    """
+    keys = [RESPONSES_TAG_KEY % tag for tag in tags]
+    versions = backend.get_many(keys)
+
+    for key in keys:
+        if not key in versions:
+            backend.add(key, int(time.time() * 1000))
+            versions[key] = backend.get(key)
+
+    return [str(versions[key]) for key in keys]
+
+
+def get_vary_value(request, item):
+    """
+    Return value of input, which changes cached response.
+    """
+    if callable(item):
+        return item(request)
+    elif item == 'language':
+        return get_language()
+    elif item == 'user':
+        user = getattr(request, 'user', None)
+        value = user is not None and user.is_authenticated()
+
+        # Load user from session again on view access, so ``cached_response``
+        # knows that view used session
+        request.__dict__.pop('_cached_user', None)
+        return value
+    return request.META.get(item)
+
+
+def invalidate_cached_responses(*tags, **kwargs):
+    """
+    Invalidate all responses cached with any of ``tags``. Pass ``alias``
+    keyword argument to use other than ``'default'`` cache.
+    """
+    backend = get_cache(kwargs.get('alias', 'default'))
+    version = int(time.time() * 1000)
+
+    for tag in tags:
+        key = RESPONSES_TAG_KEY % tag
+        backend.set(key, max(version, (backend.get(key) or 0) + 1))
+
+
+def is_etag_matched(request, value):
+    """
+    Check that ``If-None-Match`` request header matches ``ETag`` value.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+
+    if not header:
+        return False
+
+    etags = parse_etags(header)
+    return '*' in etags or parse_etags(value)[0] in etags
+
+
+def is_streaming(response):
+    """
+    Check that response content is iterator, which shouldn't be consumed.
+    """
+    return getattr(response, 'streaming', False) or \
+           not getattr(response, '_is_string', True)
+
+
+def not_modified(value):
+    response = HttpResponseNotModified()
+    response['ETag'] = value
+    return response
+
+
+def iter_json(output, encoder, ndjson=False):
+    """
+    Encode view output to JSON by chunks. Items of generators and querysets
+    (and of lists for NDJSON) are encoded one by one as items of JSON array or
+    lines of NDJSON.
+    """
+    sequences = (QuerySet, types.GeneratorType)
+
+    if ndjson:
+        sequences += (list, tuple)
+
+    if not isinstance(output, sequences):
+        for chunk in encoder.iterencode(output):
+            yield chunk
+
+        if ndjson:
+            yield '\n'
+        return
+
+    if isinstance(output, QuerySet):
+        output = output.iterator()
+
+    if not ndjson:
+        yield '['
+
+    for i, item in enumerate(output):
+        if i and not ndjson:
+            yield ', '
+
+        for chunk in encoder.iterencode(item):
+            yield chunk
+
+        if ndjson:
+            yield '\n'
+
+    if not ndjson:
+        yield ']'
+
+
+def make_key_part(value):
+    """
+    Convert argument of ``shared_memoized`` function to cache key part.
+    """
+    if isinstance(value, models.Model):
+        opts = value._meta
+        return '%s.%s:%s' % (opts.app_label, opts.object_name, value.pk)
+    return smart_str(repr(value))
+
+
+class Timings(object):
+    """
+    Durations of view phases, which are sent to ``Server-Timing`` response
+    header and to metrics sink.
+
+    Timings are enabled by ``timing`` decorator option or ``SERVER_TIMING``
+    setting. Metrics sink is path to function set in ``METRICS_SINK``
+    setting, which is called with view name and dict of phases durations in
+    seconds.
+    """
+    def __init__(self, func, timing=None):
+        if timing is None:
+            timing = conf('SERVER_TIMING', False)
+
+        sink = conf('METRICS_SINK', '')
+
+        self.name = '%s.%s' % (func.__module__, func.__name__)
+        self.phases = []
+        self.sink = sink and load_object(sink) or None
+        self.timing = timing
+
+        self.active = bool(self.timing or self.sink)
+        self.started = self.active and timer() or None
+
+    def finish(self, response):
+        """
+        Add ``Server-Timing`` header to response and send timings to metrics
+        sink.
+        """
+        if not self.active:
+            return response
+
+        if self.sink is not None:
+            self.sink(self.name, dict(self.phases))
+
+        if self.timing and isinstance(response, HttpResponse):
+            value = ', '.join(['%s;dur=%.3f' % (phase, duration * 1000) \
+                               for phase, duration in self.phases])
+
+            if response.has_header('Server-Timing'):
+                value = '%s, %s' % (response['Server-Timing'], value)
+
+            response['Server-Timing'] = value
+
+        return response
+
+    def mark(self, phase):
+        """
+        Finish ``phase`` and start next one.
+        """
+        if self.active:
+            now = timer()
+            self.phases.append((phase, now - self.started))
+            self.started = now
+
+
+class cached_model_property(object):
+    """
+    Decorator that turns model method into property, which value is cached on
+    model instance::
+
+        class Order(models.Model):
+            ...
+
+            @cached_model_property(fields=('price', 'quantity'))
+            def total(self):
+                ...
+
+    Cached value is invalidated after saving instance and, when ``fields``
+    option is set, after changing value of any of these fields (use
+    ``author_id`` instead of ``author`` for foreign keys).
+
+    To share cached values between requests, set ``cache`` option to ``True``
+    (``MEMOIZED_CACHE`` setting or ``'default'`` alias is used) or to Django
+    cache alias. Values are stored in cache by model, primary key and
+    ``version`` option (change it when method returns values in other format)
+    for ``timeout`` seconds.
+
+    Use ``invalidate(instance)`` method to invalidate cached value manually.
+    """
+    def __init__(self, func=None, fields=None, cache=None, timeout=None,
+                 version=None):
+        if cache is True:
+            cache = conf('MEMOIZED_CACHE', 'default')
+
+        self.cache_alias = cache
+        self.fields = tuple(fields or ())
+        self.model = None
+        self.timeout = timeout
+        self.version = version
+
+        self._cache = None
+
+        if func is not None:
+            self(func)
+
+    def __call__(self, func):
+        # Decorator called with options, e.g.
+        # ``@cached_model_property(fields=('price', ))``
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        return self
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+
+        attr = '_cached_%s' % self.name
+        state = tuple([getattr(obj, field) for field in self.fields])
+
+        if attr in obj.__dict__:
+            cached_state, value = obj.__dict__[attr]
+
+            if cached_state == state:
+                return value
+
+        key = None
+
+        if self.cache_alias is not None and obj.pk is not None:
+            key = self.make_key(obj)
+            cached = self.cache.get(key)
+
+            if cached is not None and cached[0] == state:
+                obj.__dict__[attr] = cached
+                return cached[1]
+
+        value = self.func(obj)
+        obj.__dict__[attr] = (state, value)
+
+        if key is not None:
+            self.cache.set(key, (state, value), self.timeout)
+
+        return value
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = get_cache(self.cache_alias)
+        return self._cache
+
+    def contribute_to_class(self, cls, name):
+        """
+        Invalidate cached values of model instances after saving them.
+        """
+        self.model = cls
+        setattr(cls, name, self)
+
+        post_save.connect(self.saved, weak=False,
+                          dispatch_uid='kikola:property:%s.%s.%s' % \
+                                       (cls.__module__, cls.__name__, name))
+
+    def invalidate(self, instance):
+        """
+        Invalidate value cached for ``instance``.
+        """
+        instance.__dict__.pop('_cached_%s' % self.name, None)
+
+        if self.cache_alias is not None and instance.pk is not None:
+            self.cache.delete(self.make_key(instance))
+
+    def make_key(self, instance):
+        opts = instance._meta
+
+        # Proxy models share cached values with their concrete models
+        if opts.proxy:
+            opts = opts.proxy_for_model._meta
+
+        return 'kikola:property:%s.%s.%s:%s:%s' % \
+               (opts.app_label, opts.object_name, self.name,
+                self.version or 0, instance.pk)
+
+    def saved(self, sender, instance, **kwargs):
+        if isinstance(instance, self.model):
+            self.invalidate(instance)
+
 
 class memoized(object):
     """
@@ -29,29 +615,181 @@ class memoized(object):
     If called later with the same arguments, the cached value is returned, and
     not re-evaluated.
 
+    By default cache is unbounded. To limit it, use ``maxsize`` (least
+    recently used values would be evicted first) and ``ttl`` (number of
+    seconds to keep value) options::
+
+        @memoized(maxsize=128, ttl=60)
+        def get_rates(currency):
+            ...
+
+    Use ``cache_info`` method to get cache statistics and ``cache_clear`` to
+    clear the cache.
+
+    When decorating methods, each instance gets its own cache, which is
+    stored in instance and refers to it only weakly, so cache dies together
+    with instance.
+
+    Decorator is thread-safe. When several threads call function with same
+    arguments at same time, only first of them computes value and others wait
+    for it. Exceptions are raised in all waiting threads and never cached.
+
     Original posted on: http://wiki.python.org/moin/PythonDecoratorLibrary
     """
-    def __init__(self, func):
-        self.cache = {}
+    def __init__(self, func=None, maxsize=None, ttl=None):
         self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # Weak reference to instance for caches of instance methods
+        self.instance = None
+
+        self.lock = threading.RLock()
+        self.cache_clear()
+
+    def __call__(self, *args, **kwargs):
+        # Decorator called with options, e.g. ``@memoized(maxsize=128)``
+        if self.func is None:
+            self.func = args[0]
+            return self
 
-    def __call__(self, *args):
+        key = args
+
+        if kwargs:
+            key += (KWARGS_MARK, ) + tuple(sorted(kwargs.items()))
+
+        self.lock.acquire()
         try:
-            return self.cache[args]
-        except KeyError:
-            value = self.func(*args)
-            self.cache[args] = value
-            return value
-        except TypeError:
-            # uncachable -- for instance, passing a list as an argument.
-            # Better to not cache than to blow up entirely.
-            return self.func(*args)
+            try:
+                link = self.cache.get(key)
+            except TypeError:
+                # uncachable -- for instance, passing a list as an argument.
+                # Better to not cache than to blow up entirely.
+                self.uncachable += 1
+                warnings.warn('Arguments of %r call are unhashable, so its '
+                              'value could not be cached.' % self.func,
+                              RuntimeWarning, stacklevel=2)
+                key = link = None
+            else:
+                if link is not None:
+                    self.unlink(link)
+
+                    if link[EXPIRES] is None or link[EXPIRES] > time.time():
+                        self.link(link)
+                        self.hits += 1
+                        return link[VALUE]
+
+                    del self.cache[key]
+
+                self.misses += 1
+
+                # Wait for value, which is computing by other thread. Call
+                # from computing thread itself is recursive, so compute again
+                flight = self.flights.get(key)
+
+                if flight is not None and \
+                   flight.thread is not threading.currentThread():
+                    waiting = True
+                else:
+                    flight, waiting = Flight(), False
+                    self.flights[key] = flight
+        finally:
+            self.lock.release()
+
+        if key is None:
+            return self.compute(args, kwargs)
+
+        if waiting:
+            return flight.wait()
+
+        try:
+            value = self.compute(args, kwargs)
+        except:
+            flight.exc_info = sys.exc_info()
+            self.land(key, flight)
+            raise
 
-    def __get__(self, obj, objtype):
+        flight.value = value
+
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        else:
+            expires = None
+
+        self.lock.acquire()
+        try:
+            if key in self.cache:
+                self.unlink(self.cache.pop(key))
+
+            link = [None, None, key, value, expires]
+            self.cache[key] = link
+            self.link(link)
+
+            # Evict least recently used value
+            if self.maxsize is not None and len(self.cache) > self.maxsize:
+                oldest = self.root[NEXT]
+                self.unlink(oldest)
+                del self.cache[oldest[KEY]]
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+        self.land(key, flight)
+        return value
+
+    def __get__(self, obj, objtype=None):
         """
         Support instance methods.
+
+        Returns cache of method for ``obj``. Caches are stored in instance
+        ``__dict__``, so they die together with instance, even if cached
+        values refer to it. Caches of instances without ``__dict__`` are
+        stored by instance ids and removed by weak reference callbacks.
         """
-        return partial(self.__call__, obj)
+        if obj is None:
+            return self
+
+        attr = '_memoized_%x' % id(self)
+        storage = getattr(obj, '__dict__', None)
+
+        if storage is not None:
+            method = storage.get(attr)
+
+            # Caches copied together with instance refer to original one
+            if isinstance(method, memoized) and method.instance() is obj:
+                return method
+
+        key = id(obj)
+
+        if storage is None and key in self.instances:
+            return self.instances[key][1]
+
+        def remove(ref, key=key, instances=self.instances):
+            instances.pop(key, None)
+
+        try:
+            ref = weakref.ref(obj, storage is None and remove or None)
+        except TypeError:
+            # Instance doesn't support weak references, so fall back to
+            # shared cache with instance in keys
+            return partial(self.__call__, obj)
+
+        method = memoized(self.func, self.maxsize, self.ttl)
+        method.instance = ref
+
+        if storage is not None:
+            storage[attr] = method
+            return method
+
+        self.instances[key] = (ref, method)
+        return method
+
+    def __reduce__(self):
+        # Caches of instance methods are never pickled or deep copied together
+        # with instances
+        if self.instance is not None:
+            return (dict, ())
+        return super(memoized, self).__reduce__()
 
     def __repr__(self):
         """
@@ -59,21 +797,257 @@ class memoized(object):
         """
         return self.func.__doc__
 
+    def cache_clear(self):
+        """
+        Clear the cache and its statistics.
+        """
+        self.lock.acquire()
+        try:
+            self.cache, self.flights, self.instances = {}, {}, {}
+            self.evictions = self.hits = self.misses = self.uncachable = 0
+
+            # Root of circular doubly linked list, which keeps cached values
+            # from least to most recently used
+            self.root = []
+            self.root[:] = [self.root, self.root, None, None, None]
+        finally:
+            self.lock.release()
+
+    def cache_info(self):
+        """
+        Return dict with cache statistics.
+        """
+        return {'evictions': self.evictions,
+                'hits': self.hits,
+                'maxsize': self.maxsize,
+                'misses': self.misses,
+                'size': len(self.cache),
+                'ttl': self.ttl,
+                'uncachable': self.uncachable}
+
+    def compute(self, args, kwargs):
+        """
+        Call decorated function.
+        """
+        if self.instance is not None:
+            return self.func(self.instance(), *args, **kwargs)
+        return self.func(*args, **kwargs)
+
+    def land(self, key, flight):
+        """
+        Finish computation of value for ``key`` and wake up waiting threads.
+        """
+        self.lock.acquire()
+        try:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        finally:
+            self.lock.release()
+
+        flight.done.set()
+
+    def link(self, link):
+        """
+        Add cache link to the end of usage list.
+        """
+        last = self.root[PREV]
+        link[PREV], link[NEXT] = last, self.root
+        last[NEXT] = self.root[PREV] = link
+
+    def unlink(self, link):
+        """
+        Remove cache link from usage list.
+        """
+        link[PREV][NEXT], link[NEXT][PREV] = link[NEXT], link[PREV]
+
+
+@memoized
+def load_object(path):
+    """
+    Import object by its full path.
+    """
+    module, attr = path.rsplit('.', 1)
+    __import__(module)
+    return getattr(sys.modules[module], attr)
+
+
+def profiled(func=None, sample=None, header=None, directory=None, keep=None):
+    """
+    Run view under ``cProfile`` for sample of requests and aggregate its stats
+    in ``pstats`` files.
+
+    Options:
+
+    * ``sample`` - profile one of ``sample`` requests. By default,
+      ``PROFILE_SAMPLE`` setting or 1000. Set to ``0`` to profile only
+      requests with header.
+    * ``header`` - always profile requests with this ``request.META`` key
+      (e.g. ``'HTTP_X_PROFILE'``). Any client could send it, so use header
+      only on internal servers or behind proxy, which removes it from
+      external requests. By default, ``PROFILE_HEADER`` setting or ``None``
+      (disabled).
+    * ``directory`` - directory for stats files. By default,
+      ``PROFILE_DIRECTORY`` setting or ``kikola-profiles`` in temporary
+      directory.
+    * ``keep`` - number of stats files to keep in directory, older files are
+      removed. By default, ``PROFILE_KEEP`` setting or 100.
+
+    Stats of each view are aggregated in one file per hour and process, named
+    as ``<module>.<view>.<YYYYmmddHH>.<pid>.prof``. Read them by ``pstats``
+    module, which could load several files at once.
+    """
+    if sample is None:
+        sample = conf('PROFILE_SAMPLE', 1000)
+
+    header = header or conf('PROFILE_HEADER', '')
+    directory = directory or \
+                conf('PROFILE_DIRECTORY',
+                     os.path.join(tempfile.gettempdir(), 'kikola-profiles'))
+    keep = keep or conf('PROFILE_KEEP', 100)
+
+    def decorator(func):
+        name = '%s.%s' % (func.__module__, func.__name__)
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if not (header and request.META.get(header)) and \
+               (not sample or random.random() * sample >= 1):
+                return func(request, *args, **kwargs)
+
+            profiler = cProfile.Profile()
+
+            try:
+                return profiler.runcall(func, request, *args, **kwargs)
+            finally:
+                # Profiler never breaks requests, even if stats aren't saved
+                try:
+                    save_profile(profiler, name, directory, keep)
+                except Exception:
+                    logger.exception('Cannot save profile of %s view', name)
+        return wrapper
+
+    if func is not None and callable(func):
+        return decorator(func)
+    return decorator
+
+
+def profile_view(func, options):
+    """
+    Apply ``profiled`` decorator with ``options`` (``True`` or dict).
+    """
+    if not isinstance(options, dict):
+        options = {}
+    return profiled(**options)(func)
+
+
+def save_profile(profiler, name, directory, keep):
+    """
+    Add profiler stats to stats file of current hour and process, and remove
+    oldest stats files from directory.
+
+    Each process writes its own stats files, so ``PROFILE_LOCK`` is enough to
+    never lose stats of concurrent requests.
+    """
+    filename = '%s.%s.%d.prof' % (name, time.strftime('%Y%m%d%H'),
+                                  os.getpid())
+    path = os.path.join(directory, filename)
+
+    PROFILE_LOCK.acquire()
+    try:
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+        stats = pstats.Stats(profiler)
+
+        if os.path.isfile(path):
+            stats.add(path)
+
+        # Replace stats file atomically, so it is never read half written
+        temp = path + '.tmp'
+        stats.dump_stats(temp)
+        os.rename(temp, path)
+
+        filenames = []
+
+        for item in os.listdir(directory):
+            if not item.endswith('.prof'):
+                continue
+
+            # Files could be removed by other processes meanwhile
+            try:
+                mtime = os.path.getmtime(os.path.join(directory, item))
+            except OSError:
+                continue
+
+            filenames.append((mtime, item))
 
-def render_to(template_path, mimetype=None):
+        filenames.sort()
+
+        for mtime, item in filenames[:-keep]:
+            try:
+                os.unlink(os.path.join(directory, item))
+            except OSError:
+                pass
+    finally:
+        PROFILE_LOCK.release()
+
+
+def render_to(template_path, mimetype=None, etag=None, cache=None,
+              profile=None, timing=None, lazy_context=None):
     """
     Expect the dict from view. Render returned dict with RequestContext.
+
+    To answer conditional GET requests, pass ``etag=True`` (``ETag`` is hash
+    of rendered content) or ``etag`` function, which returns version of view
+    response by view arguments and called before the view.
+
+    To store rendered responses in Django cache, pass ``cache`` option (see
+    ``cached_response`` for its format)::
+
+        @render_to('orders.html', cache={'params': ('page', ),
+                                         'tags': ('orders', ),
+                                         'timeout': 300,
+                                         'vary': ('language', 'user')})
+        def orders(request):
+            ...
+
+    and call ``invalidate_cached_responses('orders')`` after orders changed.
+
+    To profile sample of requests, pass ``profile=True`` or dict with
+    ``profiled`` decorator options.
+
+    Durations of view (``view``), context processors (``context``) and
+    template rendering (``render``) phases are sent in ``Server-Timing``
+    header, if ``timing`` option or ``SERVER_TIMING`` setting is ``True``,
+    and to ``METRICS_SINK`` function (see ``Timings``).
+
+    With ``lazy_context=True`` option or ``LAZY_CONTEXT`` setting, output is
+    rendered with ``LazyRequestContext``, so context processors are called
+    only when template looks up their variables. Lazy context processors are
+    timed in ``render`` phase.
     """
     def decorator(func):
         @wraps(func)
         def wrapper(request, *args, **kwargs):
+            timings = Timings(func, timing)
             output = func(request, *args, **kwargs)
+            timings.mark('view')
 
             if not isinstance(output, dict):
-                return output
+                return timings.finish(output)
+
+            lazy = lazy_context
 
-            kwargs = {'context_instance': RequestContext(request)}
+            if lazy is None:
+                lazy = conf('LAZY_CONTEXT', False)
+
+            context_class = lazy and LazyRequestContext or RequestContext
+            kwargs = {'context_instance': context_class(request)}
             output['request'] = request
+            timings.mark('context')
 
             if 'MIME_TYPE' in output:
                 kwargs['mimetype'] = output.pop('MIME_TYPE')
@@ -87,7 +1061,20 @@ def render_to(template_path, mimetype=None):
             else:
                 template = template_path
 
-            return render_to_response(template, output, **kwargs)
+            response = render_to_response(template, output, **kwargs)
+            timings.mark('render')
+
+            return timings.finish(response)
+
+        if profile:
+            wrapper = profile_view(wrapper, profile)
+
+        if cache:
+            wrapper = cached_response(wrapper, cache)
+
+        if etag:
+            wrapper = conditional(wrapper, etag)
+
         return wrapper
     return decorator
 
@@ -95,21 +1082,121 @@ def render_to(template_path, mimetype=None):
 def render_to_json(*args, **json_kwargs):
     """
     Render output from view function as JSON response.
+
+    When view returns generator or queryset (e.g. of ``values()``), or
+    ``stream=True`` option is passed, response content is encoded by chunks
+    while sending, so whole JSON never stored in memory. Items of generators
+    and querysets are sent as JSON array or, with ``ndjson=True`` option, as
+    newline delimited JSON (NDJSON responses are always streamed). To disable
+    streaming, pass ``stream=False``.
+
+    To answer conditional GET requests, pass ``etag=True`` or ``etag``
+    function, to store responses in Django cache, pass ``cache`` option, and
+    to profile sample of requests, pass ``profile`` option, same as for
+    ``render_to`` decorator. Streamed responses aren't hashed or cached.
+
+    Same as ``render_to``, view (``view``) and JSON encoding (``encode``)
+    phases durations are sent in ``Server-Timing`` header and to metrics sink
+    if ``timing`` option passed. Encoding of streamed responses isn't timed.
+
+    Clients, which send ``application/msgpack`` in ``Accept`` header with
+    quality not lower than JSON quality, receive view output packed by
+    ``kikola.utils.msgpacklib`` with same conversions of date/times, decimal
+    and timedelta objects as in JSON encoder. Versions returned by ``etag``
+    function are suffixed by ``-msgpack`` for them. Streamed and NDJSON
+    responses are always sent as JSON. To disable MessagePack responses, pass
+    ``msgpack=False``.
+
+    Note, that middlewares, which access response content (e.g.
+    ``GZipMiddleware`` or ``USE_ETAGS`` in ``CommonMiddleware``), load whole
+    streamed content to memory.
     """
     def json_decorator(func, **json_kwargs):
+        cache = json_kwargs.pop('cache', None)
+        etag = json_kwargs.pop('etag', None)
+        msgpack = json_kwargs.pop('msgpack', True)
+        profile = json_kwargs.pop('profile', None)
+        ndjson = json_kwargs.pop('ndjson', False)
+        stream = json_kwargs.pop('stream', None)
+        timing = json_kwargs.pop('timing', None)
+
+        if ndjson:
+            json_kwargs['indent'] = None
+            mimetype = 'application/x-ndjson'
+            msgpack = False
+        else:
+            mimetype = 'application/json'
+
         @wraps(func)
         def wrapper(request, *args, **kwargs):
             # Execute view function
+            timings = Timings(func, timing)
             output = func(request, *args, **kwargs)
+            timings.mark('view')
 
             # Prepare JSON kwargs
-            defaults = {'cls': DjangoJSONEncoder,
+            defaults = {'cls': jsonlib.JSONEncoder,
                         'ensure_ascii': False}
             defaults.update(json_kwargs)
 
-            # Dumps view function output into JSON response
-            return HttpResponse(json.dumps(output, **defaults),
-                                mimetype='application/json')
+            if stream is None:
+                streaming = ndjson or \
+                    isinstance(output, (QuerySet, types.GeneratorType))
+            else:
+                streaming = stream
+
+            content_type = mimetype
+
+            if streaming or ndjson:
+                encoder = defaults.pop('cls')(**defaults)
+                content = iter_json(output, encoder, ndjson)
+
+                if streaming:
+                    response = StreamingHttpResponse(content,
+                                                     content_type=mimetype)
+                    return timings.finish(vary_on_accept(response, msgpack))
+
+                content = u''.join(content)
+            elif msgpack and accepts_msgpack(request):
+                # Pack view function output into MessagePack response
+                encoder = defaults.pop('cls')(**defaults)
+                content = msgpacklib.packb(output, default=encoder.default)
+                content_type = MSGPACK_MIMETYPES[0]
+            else:
+                # Dumps view function output into JSON response
+                content = jsonlib.dumps(output, **defaults)
+
+            timings.mark('encode')
+            response = HttpResponse(content, mimetype=content_type)
+            return timings.finish(vary_on_accept(response, msgpack))
+
+        if profile:
+            wrapper = profile_view(wrapper, profile)
+
+        if cache:
+            handled = ()
+
+            # JSON and MessagePack responses are cached separately
+            if msgpack:
+                cache = get_cache_options(cache).copy()
+                cache['vary'] = tuple(cache.get('vary', ())) + \
+                                (accepts_msgpack, )
+                handled = ('Accept', )
+
+            wrapper = cached_response(wrapper, cache, handled)
+
+        if etag:
+            if msgpack and callable(etag):
+                etag = get_negotiated_etag(etag)
+
+            wrapper = conditional(wrapper, etag)
+
+        # Undecorated view for ``kikola.core.views.json_batch``. Other
+        # decorators copy these attributes to their wrappers, so wrapper is
+        # stored too to check that view isn't decorated further
+        wrapper.json_view = func
+        wrapper.json_wrapper = wrapper
+
         return wrapper
 
     if not args and not json_kwargs:
@@ -123,6 +1210,266 @@ def render_to_json(*args, **json_kwargs):
     return decorator
 
 
+def parse_accept(accept):
+    """
+    Parse ``Accept`` header to dict of media ranges and their qualities.
+    """
+    qualities = {}
+
+    for item in accept.split(','):
+        parts = item.split(';')
+        mimetype, quality = parts[0].strip().lower(), 1.0
+
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if mimetype:
+            qualities[mimetype] = max(quality, qualities.get(mimetype, 0))
+
+    return qualities
+
+
+def vary_on_accept(response, msgpack):
+    """
+    Add ``Accept`` to ``Vary`` header of response, when content depends on
+    it.
+    """
+    if msgpack:
+        patch_vary_headers(response, ('Accept', ))
+    return response
+
+
+class shared_memoized(object):
+    """
+    Decorator that caches a function's return value in Django cache, so it is
+    shared between all processes of your project.
+
+    Options:
+
+    * ``cache`` - cache alias to use. By default, ``MEMOIZED_CACHE`` setting
+      or ``'default'``.
+    * ``timeout`` - number of seconds to keep value. By default, cache default
+      timeout.
+    * ``version`` - version of cached values, change it when function returns
+      values in other format.
+    * ``beta`` - chance to recompute value before its expiration. When value
+      is about to expire, only one caller recomputes it, while others still
+      get cached value. Set to ``0`` to disable early recomputation.
+    * ``lock_timeout`` - when value is missed only one caller computes it,
+      others wait for it no more than this number of seconds.
+
+    Cache keys are built from function name and arguments: model instances by
+    their primary keys and other values by ``repr``, so arguments should have
+    stable ``repr``.
+
+    Use ``invalidate(*args, **kwargs)`` method to remove one cached value and
+    ``invalidate_all()`` to make all cached values stale.
+    """
+    def __init__(self, func=None, cache=None, timeout=None, version=None,
+                 beta=1.0, lock_timeout=10):
+        self.func = func
+        self.cache_alias = cache or conf('MEMOIZED_CACHE', 'default')
+        self.timeout = timeout
+        self.version = version
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+
+        self._cache = None
+
+    def __call__(self, *args, **kwargs):
+        # Decorator called with options, e.g. ``@shared_memoized(timeout=60)``
+        if self.func is None:
+            self.func = args[0]
+            return self
+
+        key = self.make_key(args, kwargs)
+        stored = self.cache.get(key)
+
+        if stored is not None:
+            value, delta, expires = stored
+
+            # Probabilistic early recomputation: the closer value to its
+            # expiration and the longer it computes, the higher chance
+            if expires is None or not self.beta or \
+               time.time() - delta * self.beta * \
+               math.log(random.random() or 1e-10) < expires:
+                return value
+
+            # Only one caller recomputes value, others get cached one
+            if not self.acquire(key):
+                return value
+
+            return self.compute(key, args, kwargs)
+
+        if self.acquire(key):
+            return self.compute(key, args, kwargs)
+
+        # Wait until other caller computes value
+        deadline = time.time() + self.lock_timeout
+
+        while time.time() < deadline:
+            time.sleep(0.05)
+            stored = self.cache.get(key)
+
+            if stored is not None:
+                return stored[0]
+
+        return self.compute(key, args, kwargs, locked=False)
+
+    def __get__(self, obj, objtype=None):
+        """
+        Support instance methods.
+        """
+        if obj is None:
+            return self
+        return partial(self.__call__, obj)
+
+    def __repr__(self):
+        """
+        Return the function's docstring.
+        """
+        return self.func.__doc__
+
+    def acquire(self, key):
+        """
+        Acquire lock to compute value for ``key``.
+        """
+        return self.cache.add(key + ':lock', 1, self.lock_timeout)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = get_cache(self.cache_alias)
+        return self._cache
+
+    def compute(self, key, args, kwargs, locked=True):
+        """
+        Compute and store value for ``key``, release lock after.
+        """
+        try:
+            started = time.time()
+            value = self.func(*args, **kwargs)
+            delta = time.time() - started
+
+            timeout = self.timeout or self.cache.default_timeout
+            expires = timeout and time.time() + timeout or None
+
+            self.cache.set(key, (value, delta, expires), timeout)
+            return value
+        finally:
+            if locked:
+                self.cache.delete(key + ':lock')
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Remove value cached for given arguments.
+        """
+        self.cache.delete(self.make_key(args, kwargs))
+
+    def invalidate_all(self):
+        """
+        Make all cached values of function stale.
+        """
+        key = self.make_prefix() + ':generation'
+
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.get_generation(key)
+
+    def get_generation(self, key):
+        """
+        Return current generation of cached values. Missed generation is
+        started from current time, so values cached before generation key
+        was evicted are never used.
+        """
+        generation = self.cache.get(key)
+
+        if generation is None:
+            generation = int(time.time() * 1000)
+            self.cache.add(key, generation)
+            generation = self.cache.get(key, generation)
+
+        return generation
+
+    def make_key(self, args, kwargs):
+        """
+        Build stable cache key from function name, its arguments and current
+        generation of cached values.
+        """
+        prefix = self.make_prefix()
+        generation = self.get_generation(prefix + ':generation')
+
+        parts = [make_key_part(arg) for arg in args]
+        parts.extend(['%s=%s' % (name, make_key_part(value)) \
+                      for name, value in sorted(kwargs.items())])
+
+        digest = hashlib.md5('\n'.join(parts)).hexdigest()
+        return '%s:%s:%s' % (prefix, generation, digest)
+
+    def make_prefix(self):
+        return 'kikola:memoized:%s.%s:%s' % \
+               (self.func.__module__, self.func.__name__, self.version or 0)
+
+
+@memoized(maxsize=128)
+def compile_date_format(format):
+    """
+    Parse date format to list of ``DateFormat`` methods and literal strings.
+    """
+    parts = []
+
+    for i, piece in enumerate(re_formatchars.split(force_unicode(format))):
+        if i % 2:
+            parts.append(getattr(DateFormat, piece))
+        elif piece:
+            parts.append(re_escaped.sub(r'\1', piece))
+
+    return parts
+
+
+def format_date(value, format):
+    """
+    Format date or datetime same way as ``date`` template filter, but with
+    format parsed only once.
+    """
+    if not value:
+        return u''
+
+    # Only format names (e.g. ``DATE_FORMAT``) could be localized
+    if format.endswith('_FORMAT'):
+        try:
+            format = get_format(format)
+        except AttributeError:
+            pass
+
+    formatter = DateFormat(value)
+
+    try:
+        return u''.join([isinstance(part, unicode) and part or \
+                         force_unicode(part(formatter)) \
+                         for part in compile_date_format(format)])
+    except AttributeError:
+        return u''
+
+
+def get_today():
+    """
+    Return current date, which is cached until the end of the day.
+    """
+    if time.time() >= TODAY_CACHE[1]:
+        today = TODAY()
+        tomorrow = today + datetime.timedelta(days=1)
+        TODAY_CACHE[:] = [today, time.mktime(tomorrow.timetuple())]
+    return TODAY_CACHE[0]
+
+
 def smart_datetime(datetime_format=None, time_format=None, compare_date=None):
     """
     Format ``datetime.datetime`` or compatible object returned by ``func`` with
@@ -136,27 +1483,21 @@ def smart_datetime(datetime_format=None, time_format=None, compare_date=None):
 
     Also, you can to compare returned datetime with other date, not today,
     by sending it as ``compare_date`` arg.
+
+    Formats are parsed only once and today is checked on each call.
     """
     def datetime_decorator(func, datetime_format=None, time_format=None,
                            compare_date=None):
-        compare_date = compare_date or TODAY()
         datetime_format = \
             datetime_format or conf('DATETIME_FORMAT', 'F d, H:i')
         time_format = time_format or conf('TIME_FORMAT', 'H:i')
 
         @wraps(func)
         def wrapper(*args, **kwargs):
-            value = func(*args, **kwargs)
-
-            if not hasattr(value, 'date'):
-                return value
-
-            if value.date() == compare_date:
-                format = time_format
-            else:
-                format = datetime_format
-
-            return date_filter(value, format)
+            return format_smart_datetime(func(*args, **kwargs),
+                                         datetime_format,
+                                         time_format,
+                                         compare_date or get_today())
         return wrapper
 
     if datetime_format and callable(datetime_format):
@@ -173,3 +1514,36 @@ def smart_datetime(datetime_format=None, time_format=None, compare_date=None):
                                   time_format,
                                   compare_date)
     return decorator
+
+
+def format_smart_datetime(value, datetime_format, time_format, compare_date):
+    """
+    Format value with ``time_format`` if it is same day as ``compare_date`` or
+    with ``datetime_format`` otherwise.
+    """
+    if not hasattr(value, 'date'):
+        return value
+
+    if value.date() == compare_date:
+        return format_date(value, time_format)
+    return format_date(value, datetime_format)
+
+
+def smart_datetimes(values, datetime_format=None, time_format=None,
+                    compare_date=None, attr=None):
+    """
+    Bulk variant of ``smart_datetime``. Format list of datetimes or, if
+    ``attr`` passed, values of this attribute of each object in list or
+    queryset.
+    """
+    compare_date = compare_date or get_today()
+    datetime_format = datetime_format or conf('DATETIME_FORMAT', 'F d, H:i')
+    time_format = time_format or conf('TIME_FORMAT', 'H:i')
+
+    if attr is not None:
+        values = [getattr(value, attr) for value in values]
+
+    return [format_smart_datetime(value,
+                                  datetime_format,
+                                  time_format,
+                                  compare_date) for value in values]
@@ -0,0 +1,156 @@
+"""
+Views for Django projects.
+"""
+
+import copy
+import logging
+import types
+
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import Resolver404, resolve
+from django.db.models.query import QuerySet
+from django.http import Http404, HttpResponse, QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from kikola.core.decorators import render_to_json
+from kikola.shortcuts import conf
+from kikola.utils import jsonlib
+
+# Batch only calls views with GET requests, so it doesn't need CSRF
+# protection
+try:
+    from django.views.decorators.csrf import csrf_exempt
+except ImportError:
+    csrf_exempt = lambda func: func
+
+
+__all__ = ('json_batch', )
+
+
+JSON_BATCH_MAX_REQUESTS = conf('JSON_BATCH_MAX_REQUESTS', 20)
+
+
+logger = logging.getLogger('kikola.core.views')
+
+
+@csrf_exempt
+@render_to_json
+def json_batch(request):
+    """
+    Call many views decorated by ``render_to_json`` in one request and return
+    JSON list with their outputs.
+
+    Send JSON list to this view in POST body, where each item is path or dict
+    with ``path`` and ``params`` (GET params) keys::
+
+        ["/api/user/", {"path": "/api/orders/", "params": {"page": 2}}]
+
+    Views are called in process with GET requests, without middlewares and
+    other options of ``render_to_json`` (cache, etag, etc). Views, which are
+    decorated by other decorators after ``render_to_json``, are called with
+    all of them and their responses are loaded from JSON. Views, which
+    aren't decorated by ``render_to_json``, and batch view itself are never
+    called. Response is list of dicts with ``path``, ``status`` and ``data``
+    (view output) or ``error`` keys.
+    """
+    try:
+        items = jsonlib.loads(request.raw_post_data)
+    except ValueError:
+        items = None
+
+    if not isinstance(items, list):
+        return {'error': 'Please, supply JSON list of requests.'}
+
+    if len(items) > JSON_BATCH_MAX_REQUESTS:
+        return {'error': 'Please, supply no more than %d requests.' % \
+                         JSON_BATCH_MAX_REQUESTS}
+
+    output = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            item = {'path': item}
+
+        path, params = item.get('path'), item.get('params') or {}
+
+        if not isinstance(path, basestring):
+            output.append({'error': 'Please, supply path.',
+                           'path': path,
+                           'status': 400})
+            continue
+
+        if not isinstance(params, dict):
+            output.append({'error': 'Please, supply params as JSON object.',
+                           'path': path,
+                           'status': 400})
+            continue
+
+        try:
+            data = call_json_view(request, path, params)
+        except (Http404, Resolver404):
+            data = {'error': 'Not found.', 'status': 404}
+        except PermissionDenied:
+            data = {'error': 'Permission denied.', 'status': 403}
+        except Exception:
+            logger.exception('Cannot call view by %r path in JSON batch',
+                             path)
+            data = {'error': 'Internal server error.', 'status': 500}
+
+        data.update({'path': path})
+        output.append(data)
+
+    return output
+
+
+def call_json_view(request, path, params):
+    """
+    Call view found by ``path`` with copy of ``request`` with GET ``params``.
+    """
+    view, args, kwargs = resolve(path)
+    json_view = getattr(view, 'json_view', None)
+
+    # Check view before calling it, so views, which don't return JSON, never
+    # run
+    if json_view is None:
+        return {'error': 'View doesn\'t return JSON.', 'status': 400}
+
+    if json_view is json_batch.json_view:
+        return {'error': 'Batch requests couldn\'t be nested.', 'status': 400}
+
+    query = QueryDict('', mutable=True)
+
+    for key, value in params.items():
+        if isinstance(value, list):
+            query.setlist(key, [unicode(item) for item in value])
+        else:
+            query[key] = unicode(value)
+
+    subrequest = copy.copy(request)
+    subrequest.GET = query
+    subrequest.META = dict(request.META,
+                           HTTP_ACCEPT='application/json',
+                           QUERY_STRING=query.urlencode(),
+                           REQUEST_METHOD='GET')
+    subrequest.method = 'GET'
+    subrequest.path = subrequest.path_info = path
+
+    # Reset POST data and cached ``request.REQUEST``
+    subrequest._files, subrequest._post = MultiValueDict(), QueryDict('')
+    subrequest.__dict__.pop('_request', None)
+
+    if getattr(view, 'json_wrapper', None) is view:
+        response = json_view(subrequest, *args, **kwargs)
+
+        if not isinstance(response, HttpResponse):
+            if isinstance(response, (QuerySet, types.GeneratorType)):
+                response = list(response)
+            return {'data': response, 'status': 200}
+    else:
+        response = view(subrequest, *args, **kwargs)
+
+    if not response['Content-Type'].startswith('application/json'):
+        return {'error': 'View doesn\'t return JSON.',
+                'status': response.status_code}
+
+    return {'data': jsonlib.loads(response.content),
+            'status': response.status_code}
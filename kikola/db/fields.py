@@ -6,15 +6,13 @@ import datetime
 import re
 
 from django import VERSION
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.utils import simplejson
 from django.utils.encoding import smart_str
 from django.utils.translation import ugettext_lazy as _
 
 from kikola import forms
 from kikola.shortcuts import conf
-from kikola.utils import str_to_timedelta, timedelta_seconds
+from kikola.utils import jsonlib, str_to_timedelta, timedelta_seconds
 
 if conf('USE_CPICKLE', False):
     import cPickle as pickle
@@ -37,15 +35,15 @@ class JSONField(models.TextField):
     Model field that stores all Python object as JSON string.
 
     You should set custom encoder class for dumps Python object to JSON data
-    via ``encoder_cls`` keyword argument. By default, ``DjangoJSONEncoder``
-    would be used.
+    via ``encoder_cls`` keyword argument. By default,
+    ``kikola.utils.jsonlib.JSONEncoder`` would be used.
     """
     __metaclass__ = models.SubfieldBase
 
     encoder_cls = None
 
     def __init__(self, *args, **kwargs):
-        self.encoder_cls = kwargs.pop('encoder_cls', DjangoJSONEncoder)
+        self.encoder_cls = kwargs.pop('encoder_cls', jsonlib.JSONEncoder)
         super(JSONField, self).__init__(*args, **kwargs)
 
     def contribute_to_class(self, cls, name):
@@ -78,7 +76,7 @@ class JSONField(models.TextField):
         return super(JSONField, self).get_default()
 
     def get_prep_value(self, value):
-        return simplejson.dumps(value, cls=self.encoder_cls)
+        return jsonlib.dumps(value, cls=self.encoder_cls)
 
     def to_python(self, value):
         if not isinstance(value, basestring):
@@ -88,7 +86,7 @@ class JSONField(models.TextField):
             return value
 
         try:
-            return simplejson.loads(value, encoding=conf('DEFAULT_CHARSET'))
+            return jsonlib.loads(value, encoding=conf('DEFAULT_CHARSET'))
         except ValueError, e:
             # If string could not parse as JSON it's means that it's Python
             # string saved to JSONField.
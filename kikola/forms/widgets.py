@@ -9,14 +9,12 @@ from time import strptime
 
 from django import forms
 from django.core.urlresolvers import NoReverseMatch, reverse
-from django.core.serializers.json import DjangoJSONEncoder
 from django.forms.util import flatatt
-from django.utils import simplejson
 from django.utils.dates import MONTHS, MONTHS_3
 from django.utils.encoding import force_unicode
 from django.utils.safestring import mark_safe
 
-from kikola.utils import timedelta_to_str
+from kikola.utils import jsonlib, timedelta_to_str
 
 
 __all__ = ('AutocompleteWidget', 'JSONWidget', 'SelectDateWidget',
@@ -32,7 +30,7 @@ class AutocompleteWidget(forms.TextInput):
     view.
 
     Widget support all jquery-autocomplete options that dumped to JavaScript
-    via django.utils.simplejson.
+    via ``kikola.utils.jsonlib``.
 
     **Note** You must init one of ``choices`` or ``choices_url`` attribute.
     Else widget raises TypeError when rendering.
@@ -87,8 +85,8 @@ class AutocompleteWidget(forms.TextInput):
 
         if self.choices:
             self.set_current_choice(value)
-            choices = simplejson.dumps([unicode(v) for k, v in self.choices],
-                                       ensure_ascii=False)
+            choices = jsonlib.dumps([unicode(v) for k, v in self.choices],
+                                    ensure_ascii=False)
             html_code = HiddenInput().render(name, value=value)
             name += '_autocomplete'
         else:
@@ -96,9 +94,9 @@ class AutocompleteWidget(forms.TextInput):
 
         if self.choices_url:
             try:
-                choices = simplejson.dumps(reverse(str(self.choices_url)))
+                choices = jsonlib.dumps(reverse(str(self.choices_url)))
             except NoReverseMatch:
-                choices = simplejson.dumps(self.choices_url)
+                choices = jsonlib.dumps(self.choices_url)
 
         if self.options or self.extra:
             if 'extraParams' in self.options:
@@ -106,13 +104,13 @@ class AutocompleteWidget(forms.TextInput):
             else:
                 self.options['extraParams'] = self.extra
 
-            options = ', ' + simplejson.dumps(self.options,
-                                              indent=4,
-                                              sort_keys=True)
+            options = ', ' + jsonlib.dumps(self.options,
+                                           indent=4,
+                                           sort_keys=True)
             extra = []
 
             for k, v in self.extra.items():
-                options = options.replace(simplejson.dumps(v), v)
+                options = options.replace(jsonlib.dumps(v), v)
                 extra.append(
                     u"function %s() { return $('#id_%s').val(); }\n" % (v, k)
                 )
@@ -175,12 +173,12 @@ class JSONWidget(forms.Textarea):
 
     def render(self, name, value, attrs=None):
         if not isinstance(value, basestring):
-            defaults = {'cls': DjangoJSONEncoder,
+            defaults = {'cls': jsonlib.JSONEncoder,
                         'ensure_ascii': False,
                         'indent': 4,
                         'sort_keys': True}
             defaults.update(self.json_options)
-            value = simplejson.dumps(value, **defaults)
+            value = jsonlib.dumps(value, **defaults)
 
         return super(JSONWidget, self).render(name, value, attrs)
 
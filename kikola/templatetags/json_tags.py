@@ -45,9 +45,9 @@ Template renders as::
 
 """
 
-from django.core.serializers.json import DjangoJSONEncoder
 from django.template import Library
-from django.utils import simplejson
+
+from kikola.utils import jsonlib
 
 
 register = Library()
@@ -55,4 +55,4 @@ register = Library()
 
 @register.filter
 def jsonify(obj, safe=False):
-    return simplejson.dumps(obj, cls=DjangoJSONEncoder)
+    return jsonlib.dumps(obj)
@@ -0,0 +1,149 @@
+"""
+====================
+kikola.utils.jsonlib
+====================
+
+JSON backend used by all kikola JSON call sites: ``render_to_json``
+decorator, ``JSONField`` model field, ``JSONWidget`` form widget and
+``jsonify`` template filter.
+
+Backend is selected once on import by ``JSON_BACKEND`` setting, which should
+be full path to module with ``json`` compatible API (e.g. ``'simplejson'``).
+By default, first C accelerated module from ``simplejson``, ``json`` and
+``django.utils.simplejson`` is used, or first existed if none of them
+accelerated.
+
+Contents
+========
+
+JSONEncoder
+-----------
+
+JSON encoder, which knows how to work with date/times, decimal, timedelta
+(as number of seconds) and UUID objects. Encoders for these types are looked
+up by value type in ``DISPATCH`` dict, instead of checking value against each
+of types. Dates and times are dumped in same formats as
+``DjangoJSONEncoder`` does.
+
+dumps
+-----
+
+Dump value to JSON string. By default, ``JSONEncoder`` is used, custom
+encoder class could be passed via ``cls`` keyword argument.
+
+loads
+-----
+
+Load value from JSON string.
+
+"""
+
+import datetime
+import decimal
+import inspect
+import sys
+import uuid
+
+from kikola.shortcuts import conf
+
+
+__all__ = ('JSONEncoder', 'backend', 'dumps', 'loads')
+
+
+BACKENDS = ('simplejson', 'json', 'django.utils.simplejson')
+DATE_FORMAT = '%Y-%m-%d'
+TIME_FORMAT = '%H:%M:%S'
+
+
+def import_module(name):
+    """
+    Import module by its full name.
+    """
+    __import__(name)
+    return sys.modules[name]
+
+
+def is_accelerated(module):
+    """
+    Check that JSON module encodes values by C extension.
+    """
+    encoder = getattr(module, 'encoder', None)
+    return getattr(encoder, 'c_make_encoder', None) is not None
+
+
+def load_backend(name=None):
+    """
+    Import JSON module by ``name`` or select the fastest one.
+    """
+    if name:
+        return import_module(name)
+
+    modules = []
+
+    for name in BACKENDS:
+        try:
+            module = import_module(name)
+        except ImportError:
+            continue
+
+        if is_accelerated(module):
+            return module
+
+        modules.append(module)
+
+    return modules[0]
+
+
+backend = load_backend(conf('JSON_BACKEND', ''))
+USE_DECIMAL = \
+    'use_decimal' in inspect.getargspec(backend.JSONEncoder.__init__)[0]
+
+
+class JSONEncoder(backend.JSONEncoder):
+    """
+    JSON encoder subclass that knows how to work with date/times, decimal,
+    timedelta and UUID objects.
+    """
+    DISPATCH = {
+        datetime.date: lambda self, value: value.strftime(DATE_FORMAT),
+        datetime.datetime: lambda self, value: \
+            value.strftime('%s %s' % (DATE_FORMAT, TIME_FORMAT)),
+        datetime.time: lambda self, value: value.strftime(TIME_FORMAT),
+        datetime.timedelta: lambda self, value: \
+            value.days * 86400 + value.seconds + value.microseconds / 1E6,
+        decimal.Decimal: lambda self, value: str(value),
+        uuid.UUID: lambda self, value: str(value),
+    }
+
+    def __init__(self, *args, **kwargs):
+        # ``simplejson`` dumps decimals as numbers by itself, so disable it
+        # to look up their encoder in ``DISPATCH``
+        if USE_DECIMAL:
+            kwargs.setdefault('use_decimal', False)
+        super(JSONEncoder, self).__init__(*args, **kwargs)
+
+    def default(self, value):
+        # Look up encoder by value type first, then by its base classes
+        for cls in type(value).__mro__:
+            if cls in self.DISPATCH:
+                return self.DISPATCH[cls](self, value)
+        return super(JSONEncoder, self).default(value)
+
+
+DEFAULT_ENCODER = JSONEncoder()
+
+
+def dumps(value, cls=None, **kwargs):
+    """
+    Dump value to JSON string by ``cls`` encoder.
+    """
+    if cls is None and not kwargs:
+        return DEFAULT_ENCODER.encode(value)
+    return (cls or JSONEncoder)(**kwargs).encode(value)
+
+
+def loads(value, **kwargs):
+    """
+    Load value from JSON string.
+    """
+    return backend.loads(value, **kwargs)
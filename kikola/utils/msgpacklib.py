@@ -0,0 +1,256 @@
+"""
+=======================
+kikola.utils.msgpacklib
+=======================
+
+Compact binary `MessagePack <http://msgpack.org>`_ serialization, used by
+``render_to_json`` decorator for clients, which accept
+``application/msgpack`` responses.
+
+If ``msgpack`` package is installed it would be used, otherwise values are
+packed by pure Python implementation. Both produce same bytes: UTF-8 byte
+strings are packed as strings and other byte strings as binary data.
+
+Contents
+========
+
+packb
+-----
+
+Pack value to MessagePack bytes. Pass ``default`` function to convert values
+of other than ``None``, bool, number, string, list, tuple and dict types,
+e.g. ``default`` method of ``kikola.utils.jsonlib.JSONEncoder`` instance.
+
+unpackb
+-------
+
+Unpack value from MessagePack bytes. Strings are unpacked as unicode.
+
+"""
+
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+__all__ = ('packb', 'unpackb')
+
+
+# Formats of fixed size values: code -> (struct format, size)
+FIXED_FORMATS = {
+    '\xca': ('>f', 4), '\xcb': ('>d', 8),
+    '\xcc': ('>B', 1), '\xcd': ('>H', 2), '\xce': ('>I', 4), '\xcf': ('>Q', 8),
+    '\xd0': ('>b', 1), '\xd1': ('>h', 2), '\xd2': ('>i', 4), '\xd3': ('>q', 8),
+}
+
+# Formats of strings, arrays and maps: code -> (kind, length format, size)
+SIZED_FORMATS = {
+    '\xc4': ('bin', '>B', 1), '\xc5': ('bin', '>H', 2),
+    '\xc6': ('bin', '>I', 4),
+    '\xd9': ('str', '>B', 1), '\xda': ('str', '>H', 2),
+    '\xdb': ('str', '>I', 4),
+    '\xdc': ('array', '>H', 2), '\xdd': ('array', '>I', 4),
+    '\xde': ('map', '>H', 2), '\xdf': ('map', '>I', 4),
+}
+
+
+def packb(value, default=None):
+    """
+    Pack value to MessagePack bytes.
+    """
+    if msgpack is not None:
+        if default is not None:
+            convert = lambda value: normalize(default(value))
+        else:
+            convert = None
+
+        return msgpack.packb(normalize(value), default=convert,
+                             use_bin_type=True)
+
+    chunks = []
+    pack_value(value, chunks.append, default)
+    return ''.join(chunks)
+
+
+def normalize(value):
+    """
+    Convert UTF-8 byte strings in value to unicode, so ``msgpack`` packs them
+    as strings, not as binary data.
+    """
+    if isinstance(value, str):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value
+    elif isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    elif isinstance(value, dict):
+        return dict([(normalize(key), normalize(item)) \
+                     for key, item in value.iteritems()])
+    return value
+
+
+def pack_length(length, fixed, fixed_max, types, write):
+    """
+    Pack length of string, array or map header.
+    """
+    if length <= fixed_max:
+        write(chr(fixed | length))
+    elif length <= 0xff and types[0] is not None:
+        write(types[0] + struct.pack('>B', length))
+    elif length <= 0xffff:
+        write(types[1] + struct.pack('>H', length))
+    else:
+        write(types[2] + struct.pack('>I', length))
+
+
+def pack_value(value, write, default):
+    if value is None:
+        write('\xc0')
+    elif value is True:
+        write('\xc3')
+    elif value is False:
+        write('\xc2')
+    elif isinstance(value, (int, long)):
+        if 0 <= value <= 0x7f:
+            write(chr(value))
+        elif -32 <= value < 0:
+            write(struct.pack('>b', value))
+        elif 0 <= value <= 0xff:
+            write('\xcc' + struct.pack('>B', value))
+        elif 0 <= value <= 0xffff:
+            write('\xcd' + struct.pack('>H', value))
+        elif 0 <= value <= 0xffffffff:
+            write('\xce' + struct.pack('>I', value))
+        elif 0 <= value:
+            write('\xcf' + struct.pack('>Q', value))
+        elif -0x80 <= value:
+            write('\xd0' + struct.pack('>b', value))
+        elif -0x8000 <= value:
+            write('\xd1' + struct.pack('>h', value))
+        elif -0x80000000 <= value:
+            write('\xd2' + struct.pack('>i', value))
+        else:
+            write('\xd3' + struct.pack('>q', value))
+    elif isinstance(value, float):
+        write('\xcb' + struct.pack('>d', value))
+    elif isinstance(value, basestring):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+            binary = False
+        else:
+            # Not UTF-8 byte strings are packed as binary data
+            try:
+                value.decode('utf-8')
+                binary = False
+            except UnicodeDecodeError:
+                binary = True
+
+        if binary:
+            pack_length(len(value), 0, -1, ('\xc4', '\xc5', '\xc6'), write)
+        else:
+            pack_length(len(value), 0xa0, 31, ('\xd9', '\xda', '\xdb'), write)
+
+        write(value)
+    elif isinstance(value, (list, tuple)):
+        pack_length(len(value), 0x90, 15, (None, '\xdc', '\xdd'), write)
+
+        for item in value:
+            pack_value(item, write, default)
+    elif isinstance(value, dict):
+        pack_length(len(value), 0x80, 15, (None, '\xde', '\xdf'), write)
+
+        for key, item in value.iteritems():
+            pack_value(key, write, default)
+            pack_value(item, write, default)
+    elif default is not None:
+        pack_value(default(value), write, default)
+    else:
+        raise TypeError('%r is not MessagePack serializable' % value)
+
+
+def unpackb(data):
+    """
+    Unpack value from MessagePack bytes.
+    """
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False)
+
+    value, offset = unpack_value(data, 0)
+
+    if offset != len(data):
+        raise ValueError('Extra data after packed value')
+
+    return value
+
+
+def unpack_value(data, offset):
+    """
+    Unpack value from ``data`` at ``offset``, return value and offset after
+    it.
+    """
+    try:
+        code = data[offset]
+    except IndexError:
+        raise ValueError('Unexpected end of packed data')
+
+    byte, offset = ord(code), offset + 1
+
+    if byte <= 0x7f:
+        return byte, offset
+    elif byte >= 0xe0:
+        return byte - 0x100, offset
+    elif code == '\xc0':
+        return None, offset
+    elif code == '\xc2':
+        return False, offset
+    elif code == '\xc3':
+        return True, offset
+    elif code in FIXED_FORMATS:
+        format, size = FIXED_FORMATS[code]
+        return struct.unpack(format, data[offset:offset + size])[0], \
+               offset + size
+
+    if 0xa0 <= byte <= 0xbf:
+        kind, length = 'str', byte & 0x1f
+    elif 0x90 <= byte <= 0x9f:
+        kind, length = 'array', byte & 0x0f
+    elif 0x80 <= byte <= 0x8f:
+        kind, length = 'map', byte & 0x0f
+    elif code in SIZED_FORMATS:
+        kind, format, size = SIZED_FORMATS[code]
+        length = struct.unpack(format, data[offset:offset + size])[0]
+        offset += size
+    else:
+        raise ValueError('Unsupported MessagePack type 0x%02x' % byte)
+
+    if kind in ('bin', 'str'):
+        value = data[offset:offset + length]
+
+        if len(value) != length:
+            raise ValueError('Unexpected end of packed data')
+
+        if kind == 'str':
+            value = value.decode('utf-8')
+
+        return value, offset + length
+
+    if kind == 'array':
+        value = []
+
+        for i in xrange(length):
+            item, offset = unpack_value(data, offset)
+            value.append(item)
+
+        return value, offset
+
+    value = {}
+
+    for i in xrange(length):
+        key, offset = unpack_value(data, offset)
+        value[key], offset = unpack_value(data, offset)
+
+    return value, offset
@@ -44,12 +44,12 @@ function.
 import datetime
 import re
 
-from django.core.serializers.json import DjangoJSONEncoder
 from django.template.defaultfilters import pluralize
 from django.utils.translation import ugettext, ungettext
 
 from kikola.shortcuts import conf
 from kikola.utils.digits import force_int
+from kikola.utils.jsonlib import JSONEncoder
 
 
 __all__ = ('TimedeltaJSONEncoder', 'str_to_timedelta', 'timedelta_average',
@@ -98,17 +98,16 @@ TIMEDELTA_FORMATS = {
 }
 
 
-class TimedeltaJSONEncoder(DjangoJSONEncoder):
+class TimedeltaJSONEncoder(JSONEncoder):
     """
     JSON encoder subclass that knows how to work with date/times, timedelta and
-    decimal objects.
+    decimal objects. Timedelta objects are dumped in ``TIMEDELTA_FORMAT``.
     """
-    TIMEDELTA_FORMAT = TIMEDELTA_FORMAT
+    DISPATCH = dict(JSONEncoder.DISPATCH)
+    DISPATCH[datetime.timedelta] = lambda self, value: \
+        timedelta_to_str(value, self.TIMEDELTA_FORMAT)
 
-    def default(self, value):
-        if isinstance(value, datetime.timedelta):
-            return timedelta_to_str(value, self.TIMEDELTA_FORMAT)
-        return super(TimedeltaJSONEncoder, self).default(value)
+    TIMEDELTA_FORMAT = TIMEDELTA_FORMAT
 
 
 def str_to_timedelta(value, format=None):
@@ -29,6 +29,8 @@ setup(
         'kikola',
         'kikola.contrib',
         'kikola.contrib.basicsearch',
+        'kikola.contrib.basicsearch.management',
+        'kikola.contrib.basicsearch.management.commands',
         'kikola.core',
         'kikola.db',
         'kikola.forms',
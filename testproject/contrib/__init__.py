@@ -0,0 +1,7 @@
+"""
+===================
+testproject.contrib
+===================
+
+Test contents of ``kikola.contrib`` package.
+"""
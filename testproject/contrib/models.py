@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from kikola.db.fields import JSONField, MonthField, TimeDeltaField
+
+
+__all__ = ('Article', )
+
+
+class Article(models.Model):
+    """
+    Dummy model for testing ``basicsearch`` application.
+    """
+    title = models.CharField(_('title'), max_length=64)
+    content = models.TextField(_('content'), blank=True)
+    category = models.CharField(_('category'), blank=True, max_length=32)
+    is_published = models.BooleanField(_('is published'), default=True)
+    attrs = JSONField(_('attributes'), blank=True, default={})
+    duration = TimeDeltaField(_('duration'), blank=True, null=True)
+    month = MonthField(_('month'), blank=True, null=True)
+    rating = models.PositiveIntegerField(_('rating'), default=0)
+
+    class Meta:
+        ordering = ('title', )
+
+    def __unicode__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return '/articles/%d/' % self.pk
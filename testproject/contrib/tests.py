@@ -0,0 +1,428 @@
+from __future__ import with_statement
+
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import simplejson
+
+from kikola.contrib.basicsearch import compaction, forms as search_forms, \
+    models as search_models, utils as search_utils
+from kikola.contrib.basicsearch.forms import SearchForm
+from kikola.contrib.basicsearch.management.commands import \
+    rebuild_search_index
+from kikola.contrib.basicsearch.models import SearchEntry
+
+from testproject.contrib.models import Article
+
+
+SEARCH_MODULES = (compaction, search_forms, search_models, search_utils,
+                  rebuild_search_index)
+
+
+TEST_ARTICLES = (
+    ('Laptop review', 'Our new laptop is fast and light.', True),
+    ('Laptop bags', 'Best bags for your laptop.', True),
+    ('Lapwing', 'Lapwing is a bird.', True),
+    ('Laptop secrets', 'Unpublished laptop article.', False),
+)
+TEST_COLOR = u'\u041a\u0440\u0430\u0441\u043d\u044b\u0439'
+TEST_SESSION_KEY = 'test_session_key'
+
+
+class BaseSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.old_settings = {}
+
+        for title, content, is_published in TEST_ARTICLES:
+            Article.objects.create(title=title,
+                                   content=content,
+                                   is_published=is_published)
+
+    def tearDown(self):
+        for (module, key), value in self.old_settings.items():
+            setattr(module, key, value)
+        cache.clear()
+
+    def search(self, query, session_key=None, **kwargs):
+        data = {'query': query}
+        data.update(kwargs)
+
+        request = self.factory.get(reverse('basicsearch'), data)
+
+        if session_key is not None:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+
+        form = SearchForm(request.GET, request=request)
+        self.assertTrue(form.is_valid())
+        return form.search()
+
+    def set_setting(self, key, value):
+        for module in SEARCH_MODULES:
+            if not hasattr(module, key):
+                continue
+
+            self.old_settings.setdefault((module, key), getattr(module, key))
+            setattr(module, key, value)
+
+
+class TestBasicSearch(BaseSearchTestCase):
+
+    def test_index(self):
+        self.set_setting('SEARCH_INDEX', True)
+        self.assertEqual(SearchEntry.objects.count(), 0)
+
+        call_command('rebuild_search_index', verbosity=0)
+        self.assertEqual(SearchEntry.objects.count(), 3)
+
+        # Results page filled from search entries without loading objects
+        with self.assertNumQueries(1):
+            result = self.search('laptop')
+        self.assertEqual(result['search_count'], 2)
+
+        first = result['search_results'][0]
+        self.assertEqual(first['title'], 'Laptop bags')
+        self.assertEqual(first['description'], 'Best bags for your laptop.')
+        self.assertEqual(first['link'],
+                         Article.objects.get(title='Laptop bags').\
+                         get_absolute_url())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(first['obj'].content,
+                             'Best bags for your laptop.')
+
+        self.set_setting('SEARCH_ATTACH_OBJECTS', False)
+        result = self.search('laptop')
+        self.assertFalse('obj' in result['search_results'][0])
+
+        # Search entries updated on saving and deleting objects
+        article = Article.objects.get(title='Lapwing')
+        article.title = 'Laptop sleeve'
+        article.save()
+
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 3)
+
+        article.is_published = False
+        article.save()
+        self.assertEqual(SearchEntry.objects.count(), 2)
+
+        Article.objects.get(title='Laptop bags').delete()
+        self.assertEqual(SearchEntry.objects.count(), 1)
+
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 1)
+        self.assertEqual(result['search_results'][0]['title'],
+                         'Laptop review')
+
+    def test_index_errors(self):
+        search_models = dict(search_forms.SEARCH_MODELS)
+        search_models['auth.Group'] = {'fields': ('name', ), 'index': True}
+        self.set_setting('SEARCH_MODELS', search_models)
+
+        # Group doesn't have ``get_absolute_url``, but still could be saved
+        group = Group.objects.create(name='Laptop owners')
+        self.assertTrue(group.pk)
+        self.assertEqual(SearchEntry.objects.count(), 0)
+
+    def test_compaction(self):
+        self.set_setting('SEARCH_INDEX', True)
+        call_command('rebuild_search_index', verbosity=0)
+
+        # Entries of deleted objects and not indexed models are stale
+        article_type = ContentType.objects.get_for_model(Article)
+        user_type = ContentType.objects.get_for_model(User)
+
+        for content_type, object_id in ((article_type, 10000),
+                                        (article_type, 10001),
+                                        (user_type, 1)):
+            SearchEntry.objects.create(content_type=content_type,
+                                       object_id=object_id,
+                                       text='laptop',
+                                       title='Stale')
+
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 4)
+
+        call_command('compact_search_index', batch_size=1, verbosity=0)
+        self.assertEqual(SearchEntry.objects.count(), 3)
+
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 2)
+
+        self.assertEqual(compaction.compact_search_index(), 0)
+
+        thread = compaction.start_compaction_thread(interval=60)
+        self.assertTrue(thread.isAlive())
+        thread.stop()
+        thread.join(1)
+        self.assertFalse(thread.isAlive())
+
+    def test_facets(self):
+        search_models = dict(search_forms.SEARCH_MODELS)
+        search_models['contrib.Article'] = \
+            dict(search_models['contrib.Article'], facets=('category', ))
+        self.set_setting('SEARCH_MODELS', search_models)
+
+        Article.objects.filter(title__startswith='Laptop').\
+            update(category='Hardware')
+        Article.objects.filter(title='Lapwing').update(category='Birds')
+
+        for index in (False, True):
+            self.set_setting('SEARCH_INDEX', index)
+            call_command('rebuild_search_index', verbosity=0)
+
+            with self.assertNumQueries(1):
+                result = self.search('lap', per_page=1)
+
+            self.assertEqual(len(result['search_results']), 1)
+            self.assertEqual(result['search_facets'], [{
+                'count': 3,
+                'fields': {'category': [(u'Hardware', 2), (u'Birds', 1)]},
+                'model': 'contrib.Article',
+                'name': u'articles',
+            }])
+
+            result = self.search('nothing')
+            self.assertEqual(result['search_facets'], [])
+
+    def test_filters(self):
+        search_models = dict(search_forms.SEARCH_MODELS)
+        search_models['contrib.Article'] = \
+            dict(search_models['contrib.Article'],
+                 filters={'duration': 'duration',
+                          'month': 'month',
+                          'rating': 'rating'})
+        self.set_setting('SEARCH_MODELS', search_models)
+
+        data = (
+            ('Laptop review', '2:00', datetime.date(2011, 5, 12), 5),
+            ('Laptop bags', '0:45', datetime.date(2011, 6, 1), 3),
+            ('Lapwing', '1:30', datetime.date(2011, 5, 1), 4),
+        )
+
+        for title, duration, month, rating in data:
+            Article.objects.filter(title=title).update(duration=duration,
+                                                       month=month,
+                                                       rating=rating)
+
+        def titles(query, num=1):
+            with self.assertNumQueries(num):
+                result = self.search(query)
+            return [item['title'] for item in result.get('search_results', [])]
+
+        for index in (False, True):
+            self.set_setting('SEARCH_INDEX', index)
+            call_command('rebuild_search_index', verbosity=0)
+
+            self.assertEqual(titles('laptop duration>1:30'), ['Laptop review'])
+            self.assertEqual(titles('lap duration>=1:30'),
+                             ['Laptop review', 'Lapwing'])
+            self.assertEqual(titles('month:2011-05 lap'),
+                             ['Laptop review', 'Lapwing'])
+            self.assertEqual(titles('rating<5 month>2011-05 laptop'),
+                             ['Laptop bags'])
+            self.assertEqual(titles('rating>3'), ['Laptop review', 'Lapwing'])
+
+        # Unknown filters are part of free text, wrong values skip model
+        self.assertEqual(titles('size>3'), [])
+        self.assertEqual(titles('laptop rating>many', 0), [])
+
+    def test_json_paths(self):
+        search_models = dict(search_forms.SEARCH_MODELS)
+        search_models['contrib.Article'] = \
+            dict(search_models['contrib.Article'],
+                 fields=('title', 'attrs.color', 'attrs.tags[]'))
+        self.set_setting('SEARCH_MODELS', search_models)
+
+        article = Article.objects.get(title='Laptop review')
+        article.attrs = {'color': 'Silver', 'size': 'silverish',
+                         'tags': ['review', 'ultrabook']}
+        article.save()
+
+        article = Article.objects.get(title='Laptop bags')
+        article.attrs = {'color': TEST_COLOR}
+        article.save()
+
+        Article.objects.filter(title='Lapwing').update(attrs={'colors': []})
+
+        for index in (False, True):
+            self.set_setting('SEARCH_INDEX', index)
+            call_command('rebuild_search_index', verbosity=0)
+
+            result = self.search('silver')
+            self.assertEqual(result['search_count'], 1)
+
+            result = self.search('ultrabook')
+            self.assertEqual(result['search_count'], 1)
+            self.assertEqual(result['search_results'][0]['title'],
+                             'Laptop review')
+
+            # Non-ASCII values are escaped in serialized JSON
+            result = self.search(TEST_COLOR.lower())
+            self.assertEqual(result['search_count'], 1)
+            self.assertEqual(result['search_results'][0]['title'],
+                             'Laptop bags')
+
+            # Key names and serialized JSON punctuation are never matched
+            for query in ('color', 'tags', '": "'):
+                result = self.search(query)
+                self.assertTrue('search_error' in result, query)
+
+    def test_refine(self):
+        self.set_setting('SEARCH_REFINE', True)
+
+        result = self.search('lap', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 3)
+
+        # Found objects are cached by hash of session key
+        key = 'basicsearch:refine:%s'
+        self.assertEqual(cache.get(key % TEST_SESSION_KEY), None)
+        self.assertNotEqual(
+            cache.get(key % hashlib.md5(TEST_SESSION_KEY).hexdigest()), None
+        )
+
+        # Extended queries are refined in memory without database queries
+        with self.assertNumQueries(0):
+            result = self.search('lapt', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 2)
+
+        with self.assertNumQueries(0):
+            result = self.search('laptop b', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 1)
+        self.assertEqual(result['search_results'][0]['title'], 'Laptop bags')
+
+        # Shorter query goes to database again
+        with self.assertNumQueries(1):
+            result = self.search('lapto', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 2)
+
+        # Queries without session are never refined
+        with self.assertNumQueries(1):
+            result = self.search('laptop')
+        self.assertEqual(result['search_count'], 2)
+
+    def test_refine_max_candidates(self):
+        self.set_setting('SEARCH_REFINE', True)
+        self.set_setting('SEARCH_REFINE_MAX_CANDIDATES', 3)
+
+        # Four articles found, so they wouldn't be stored for refinement
+        self.search('lap', TEST_SESSION_KEY)
+
+        with self.assertNumQueries(1):
+            result = self.search('lapt', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 2)
+
+        with self.assertNumQueries(0):
+            result = self.search('laptop', TEST_SESSION_KEY)
+        self.assertEqual(result['search_count'], 2)
+
+    def test_search(self):
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 2)
+        self.assertEqual([item['title'] for item in result['search_results']],
+                         ['Laptop bags', 'Laptop review'])
+        self.assertEqual(result['search_results'][0]['description'],
+                         'Best bags for your laptop.')
+
+        result = self.search('nothing')
+        self.assertTrue('search_error' in result)
+
+    def test_search_batch(self):
+        url = reverse('basicsearch_batch')
+        queries = ['laptop', {'query': 'laptop', 'page': 2, 'per_page': 1},
+                   'nothing', 'la']
+
+        response = self.client.post(url,
+                                    simplejson.dumps(queries),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        data = simplejson.loads(response.content)
+        self.assertEqual(len(data), 4)
+
+        self.assertEqual(data[0]['count'], 2)
+        self.assertEqual(data[0]['pages_count'], 1)
+        self.assertEqual([item['title'] for item in data[0]['results']],
+                         ['Laptop bags', 'Laptop review'])
+
+        self.assertEqual(data[1]['page'], 2)
+        self.assertEqual(data[1]['pages_count'], 2)
+        self.assertEqual(data[1]['results'][0]['title'], 'Laptop review')
+
+        self.assertEqual(data[2]['count'], 0)
+        self.assertTrue(data[2]['error'])
+        self.assertTrue('query' in data[3]['errors'])
+
+        response = self.client.get(url, {'query': ['lapwing', 'laptop']})
+        data = simplejson.loads(response.content)
+        self.assertEqual([item['count'] for item in data], [1, 2])
+
+        # Wrong and too large pagination params are corrected
+        queries = [{'query': 'laptop', 'per_page': 'abc'},
+                   {'query': 'laptop', 'page': 'abc', 'per_page': -1},
+                   {'query': 'laptop', 'per_page': 10 ** 9}]
+        self.set_setting('SEARCH_RESULTS_MAX_PER_PAGE', 1)
+
+        response = self.client.post(url,
+                                    simplejson.dumps(queries),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        data = simplejson.loads(response.content)
+        self.assertEqual([(item['page'], item['pages_count']) \
+                          for item in data], [(1, 2), (1, 2), (1, 2)])
+
+        response = self.client.post(url, 'wrong', content_type='text/plain')
+        self.assertTrue('error' in simplejson.loads(response.content))
+
+    def test_search_time_budget(self):
+        result = self.search('laptop')
+        self.assertFalse(result['search_partial'])
+
+        self.set_setting('SEARCH_TIME_BUDGET', -1)
+
+        with self.assertNumQueries(0):
+            result = self.search('laptop')
+        self.assertTrue(result['search_partial'])
+        self.assertTrue('search_error' in result)
+
+    def test_search_view(self):
+        response = self.client.get(reverse('basicsearch'), {'query': 'lapw'})
+        self.assertContains(response, 'Lapwing is a bird.')
+
+
+class TestBasicSearchDatabase(BaseSearchTestCase):
+
+    multi_db = True
+
+    def test_search_database(self):
+        Article.objects.using('replica').create(title='Laptop in replica')
+
+        result = self.search('replica')
+        self.assertTrue('search_error' in result)
+
+        self.set_setting('SEARCH_DATABASE', 'replica')
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 1)
+        self.assertEqual(result['search_results'][0]['title'],
+                         'Laptop in replica')
+
+        # Model ``database`` option has higher priority than global setting
+        search_models = dict(search_forms.SEARCH_MODELS)
+        search_models['contrib.Article'] = \
+            dict(search_models['contrib.Article'], database='default')
+        self.set_setting('SEARCH_MODELS', search_models)
+
+        result = self.search('laptop')
+        self.assertEqual(result['search_count'], 2)
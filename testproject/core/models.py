@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from kikola.core.decorators import cached_model_property
+
+
+__all__ = ('Order', )
+
+
+class Order(models.Model):
+    """
+    Dummy model for testing ``cached_model_property`` decorator.
+    """
+    price = models.PositiveIntegerField(_('price'))
+    quantity = models.PositiveIntegerField(_('quantity'), default=1)
+    comment = models.TextField(_('comment'), blank=True)
+
+    calls = []
+
+    def __unicode__(self):
+        return u'%d x %d' % (self.price, self.quantity)
+
+    @cached_model_property(fields=('price', 'quantity'))
+    def total(self):
+        self.calls.append('total')
+        return self.price * self.quantity
+
+    @cached_model_property(cache=True, version=2)
+    def summary(self):
+        self.calls.append('summary')
+        return u'%s (%s)' % (self, self.comment)
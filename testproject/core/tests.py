@@ -1,14 +1,37 @@
+import copy
 import datetime
-
+import gc
+import os
+import re
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.http import HttpRequest
+from django.template import Template, context as template_context
 from django.template.defaultfilters import date
 from django.test import TestCase
-
-from kikola.core.context_processors import path
-from kikola.core.decorators import memoized, smart_datetime
+from django.test.client import Client
+from django.utils import simplejson
+
+from kikola.core.context_processors import LazyRequestContext, path
+from kikola.core import decorators
+from kikola.core.decorators import cached_model_property, \
+    invalidate_cached_responses, memoized, profiled, shared_memoized, \
+    smart_datetime, smart_datetimes
 from kikola.shortcuts import conf
+from kikola.utils import msgpacklib
+
+from testproject.core.models import Order
 
 
 DATETIME_FORMAT = conf('DATETIME_FORMAT', 'F d, H:i')
@@ -25,6 +48,34 @@ TEST_SITE_NAME = 'Google'
 TEST_TIME_FORMAT = 'G:i:s'
 
 
+CONTEXT_CALLS = []
+METRICS = []
+TEST_CONTEXT_PROCESSORS = ('kikola.core.context_processors.path',
+                           'testproject.core.tests.counted_context',
+                           'testproject.core.tests.unknown_context')
+
+
+def collect_metrics(name, timings):
+    METRICS.append((name, sorted(timings.keys())))
+
+
+def counted_context(request):
+    CONTEXT_CALLS.append('counted')
+    return {'COUNTED': True, 'PATH': 'counted'}
+
+counted_context.context_keys = ('COUNTED', 'PATH')
+
+
+def unknown_context(request):
+    CONTEXT_CALLS.append('unknown')
+    return {'PATH': 'unknown', 'UNKNOWN': True}
+
+
+def set_context_processors(processors):
+    settings.TEMPLATE_CONTEXT_PROCESSORS = processors
+    template_context._standard_context_processors = None
+
+
 class TestContextProcesors(TestCase):
 
     def test_path(self):
@@ -59,6 +110,38 @@ class TestContextProcesors(TestCase):
                             '"REQUEST_PATH": "%s"' % url)
 
 
+    def test_lazy_request_context(self):
+        old_processors = settings.TEMPLATE_CONTEXT_PROCESSORS
+        set_context_processors(TEST_CONTEXT_PROCESSORS)
+
+        request = HttpRequest()
+        request.META = {'SERVER_NAME': 'www.google.com',
+                        'SERVER_PORT': 80}
+        request.path = '/lazy/'
+        del CONTEXT_CALLS[:]
+
+        try:
+            context = LazyRequestContext(request)
+            context.update({'text': 'It works!'})
+            template = Template('{{ text }} {{ REQUEST_PATH }}')
+            self.assertEqual(template.render(context), 'It works! /lazy/')
+            self.assertEqual(CONTEXT_CALLS, [])
+
+            self.assertEqual(context['COUNTED'], True)
+            self.assertEqual(context['PATH'], 'counted')
+            self.assertEqual(CONTEXT_CALLS, ['counted'])
+
+            # Processors with unknown keys are called on lookup of missed var
+            self.assertEqual(context['UNKNOWN'], True)
+            self.assertEqual(context['PATH'], 'counted')
+            self.assertEqual(CONTEXT_CALLS, ['counted', 'unknown'])
+
+            self.assertFalse('undefined' in context)
+            self.assertEqual(CONTEXT_CALLS, ['counted', 'unknown'])
+        finally:
+            set_context_processors(old_processors)
+
+
 class TestDecorators(TestCase):
 
     counter = 0
@@ -96,6 +179,43 @@ class TestDecorators(TestCase):
     def yesterday_time_with_datetime_format(self):
         return NOW - DAY
 
+    def test_cached_model_property(self):
+        Order.calls = []
+        Order.summary.cache.clear()
+
+        order = Order.objects.create(price=10, quantity=2, comment='First')
+        self.assertTrue(isinstance(Order.total, cached_model_property))
+
+        self.assertEqual(order.total, 20)
+        self.assertEqual(order.total, 20)
+        self.assertEqual(Order.calls, ['total'])
+
+        # Value is recomputed after changing one of its fields
+        order.quantity = 3
+        self.assertEqual(order.total, 30)
+        self.assertEqual(Order.calls, ['total', 'total'])
+
+        # And after saving instance
+        order.save()
+        self.assertEqual(order.total, 30)
+        self.assertEqual(Order.calls, ['total'] * 3)
+
+        # Persisted values are shared between instances
+        self.assertEqual(order.summary, u'10 x 3 (First)')
+        self.assertEqual(Order.objects.get(pk=order.pk).summary,
+                         u'10 x 3 (First)')
+        self.assertEqual(Order.calls.count('summary'), 1)
+
+        order.comment = 'Changed'
+        order.save()
+        self.assertEqual(Order.objects.get(pk=order.pk).summary,
+                         u'10 x 3 (Changed)')
+        self.assertEqual(Order.calls.count('summary'), 2)
+
+        Order.summary.invalidate(order)
+        self.assertEqual(order.summary, u'10 x 3 (Changed)')
+        self.assertEqual(Order.calls.count('summary'), 3)
+
     def test_memoized(self):
         self.count_it()
         self.count_it()
@@ -108,6 +228,243 @@ class TestDecorators(TestCase):
 
         self.assertEqual(self.counter, 4)
 
+    def test_memoized_methods(self):
+        class Counter(object):
+            calls = 0
+
+            @memoized
+            def double(self, value):
+                self.calls += 1
+                return value * 2
+
+        first, second = Counter(), Counter()
+
+        self.assertEqual(first.double(2), 4)
+        self.assertEqual(first.double(2), 4)
+        self.assertEqual(second.double(2), 4)
+        self.assertEqual((first.calls, second.calls), (1, 1))
+
+        # Each instance has its own cache
+        self.assertEqual(first.double.cache_info()['size'], 1)
+        self.assertEqual(first.double.cache_info()['hits'], 1)
+        self.assertEqual(second.double.cache_info()['hits'], 0)
+
+        # Copies of instance don't share cache with it
+        third = copy.deepcopy(first)
+        self.assertEqual(third.double(2), 4)
+        self.assertEqual(third.calls, 2)
+        self.assertEqual(first.double.cache_info()['hits'], 1)
+
+        third = copy.copy(first)
+        self.assertEqual(third.double(2), 4)
+        self.assertEqual(third.calls, 2)
+
+        # Method cache doesn't keep instance alive, even without garbage
+        # collection of reference cycles
+        ref = weakref.ref(first)
+        del first
+        self.assertTrue(ref() is None)
+        self.assertEqual(Counter.double.instances, {})
+
+        # Cached values, which refer to instance, don't keep it alive too
+        class Node(object):
+            @memoized
+            def get_self(self):
+                return self
+
+        node = Node()
+        self.assertTrue(node.get_self() is node)
+
+        ref = weakref.ref(node)
+        del node
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+        # Instances without ``__dict__`` have own caches as well
+        class Slotted(object):
+            __slots__ = ('__weakref__', )
+
+            @memoized
+            def get_id(self):
+                return id(self)
+
+        slotted = Slotted()
+        self.assertEqual(slotted.get_id(), id(slotted))
+        self.assertTrue(slotted.get_id.instance() is slotted)
+        self.assertEqual(len(Slotted.get_id.instances), 1)
+
+        del slotted
+        self.assertEqual(Slotted.get_id.instances, {})
+
+    def test_memoized_options(self):
+        calls = []
+
+        @memoized(maxsize=2)
+        def square(value, power=2):
+            calls.append(value)
+            return value ** power
+
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(2, power=3), 8)
+        self.assertEqual(square(2, power=3), 8)
+        self.assertEqual(calls, [2, 3, 2])
+
+        # Value for ``3`` was least recently used, so it was evicted
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(calls, [2, 3, 2, 2, 3])
+
+        self.assertEqual(square.cache_info(),
+                         {'evictions': 3, 'hits': 2, 'maxsize': 2,
+                          'misses': 5, 'size': 2, 'ttl': None,
+                          'uncachable': 0})
+
+        square.cache_clear()
+        self.assertEqual(square.cache_info()['size'], 0)
+
+        @memoized(ttl=0)
+        def expired(value):
+            calls.append(value)
+            return value
+
+        expired(1)
+        expired(1)
+        self.assertEqual(calls.count(1), 2)
+
+        @memoized
+        def length(value):
+            return len(value)
+
+        filters = warnings.filters[:]
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        try:
+            self.assertEqual(length([1, 2]), 2)
+            self.assertEqual(length([1, 2]), 2)
+        finally:
+            warnings.filters[:] = filters
+
+        self.assertEqual(length.cache_info()['uncachable'], 2)
+        self.assertEqual(length.cache_info()['size'], 0)
+
+    def test_memoized_threads(self):
+        calls, results = [], []
+        started, release = threading.Event(), threading.Event()
+
+        @memoized
+        def load(value):
+            calls.append(value)
+            started.set()
+            release.wait()
+
+            if value < 0:
+                raise ValueError(value)
+            return value * 2
+
+        def run(value):
+            try:
+                results.append(load(value))
+            except ValueError:
+                results.append('error')
+
+        for value in (2, -2):
+            del calls[:], results[:]
+            started.clear(), release.clear()
+
+            threads = [threading.Thread(target=run, args=(value, )) \
+                       for i in range(5)]
+            threads[0].start()
+            started.wait()
+
+            for thread in threads[1:]:
+                thread.start()
+
+            # Give other threads time to start waiting for first one
+            time.sleep(0.1)
+            release.set()
+
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(calls, [value])
+
+        self.assertEqual(results, ['error'] * 5)
+        self.assertEqual(load.cache_info()['size'], 1)
+
+        # Exceptions aren't cached
+        release.set()
+        self.assertRaises(ValueError, load, -2)
+        self.assertEqual(calls, [-2, -2])
+        self.assertEqual(load(2), 4)
+
+    def test_profiled(self):
+        directory = tempfile.mkdtemp()
+
+        try:
+            @profiled(sample=0, directory=directory)
+            def never(request):
+                return 'response'
+
+            @profiled(sample=1, directory=directory, keep=1)
+            def always(request):
+                return sum(range(100))
+
+            @profiled(sample=0, header='HTTP_X_PROFILE', directory=directory,
+                      keep=1)
+            def with_header(request):
+                return 'response'
+
+            request = HttpRequest()
+            request.META['HTTP_X_PROFILE'] = '1'
+
+            # Header isn't used by default
+            self.assertEqual(never(request), 'response')
+            self.assertEqual(os.listdir(directory), [])
+
+            del request.META['HTTP_X_PROFILE']
+            self.assertEqual(always(request), 4950)
+            self.assertEqual(always(request), 4950)
+
+            # Stats of all calls are aggregated in one file
+            filenames = os.listdir(directory)
+            self.assertEqual(len(filenames), 1)
+            self.assertTrue(filenames[0].startswith(
+                'testproject.core.tests.always.'
+            ))
+            self.assertTrue(filenames[0].endswith('.%d.prof' % os.getpid()))
+
+            stats = pstats.Stats(os.path.join(directory, filenames[0]))
+            calls = [value[1] for key, value in stats.stats.items() \
+                     if key[2] == 'always']
+            self.assertEqual(calls, [2])
+
+            self.assertEqual(with_header(request), 'response')
+            self.assertEqual(os.listdir(directory), filenames)
+
+            # Only ``keep`` newest files are kept in directory
+            os.utime(os.path.join(directory, filenames[0]), (0, 0))
+            request.META['HTTP_X_PROFILE'] = '1'
+            self.assertEqual(with_header(request), 'response')
+
+            filenames = os.listdir(directory)
+            self.assertEqual(len(filenames), 1)
+            self.assertTrue(filenames[0].startswith(
+                'testproject.core.tests.with_header.'
+            ))
+
+            # Errors on saving stats don't break view
+            path = os.path.join(directory, filenames[0], 'profiles')
+
+            @profiled(sample=1, directory=path)
+            def broken(request):
+                return 'response'
+
+            self.assertEqual(broken(request), 'response')
+        finally:
+            shutil.rmtree(directory)
+
     def test_render_to(self):
         url = reverse('decorators_render_to')
         response = self.client.get(url)
@@ -128,6 +485,114 @@ class TestDecorators(TestCase):
         self.assertEqual(response['Content-Type'], 'text/plain')
         self.assertContains(response, 'It works!', count=1)
 
+    def test_render_to_cache(self):
+        cache.clear()
+
+        # CSRF token of one client is never sent to others
+        url = reverse('decorators_render_to_cache_csrf')
+        tokens = []
+
+        for i in range(2):
+            client = Client()
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            token = client.cookies[settings.CSRF_COOKIE_NAME].value
+            self.assertContains(response, token)
+            tokens.append(token)
+
+        self.assertNotEqual(tokens[0], tokens[1])
+
+        # Cached responses are sent only for same values of varied headers
+        url = reverse('decorators_render_to_cache_vary',
+                      kwargs={'header': 'X-Color'})
+        self.assertEqual(self.client.get(url, HTTP_X_COLOR='red').content,
+                         'red')
+        self.assertEqual(self.client.get(url, HTTP_X_COLOR='blue').content,
+                         'blue')
+        self.assertEqual(self.client.get(url, HTTP_X_COLOR='blue').content,
+                         'blue')
+        self.assertEqual(self.client.get(url).content, '')
+
+        # Responses, which vary on cookies, are never cached
+        url = reverse('decorators_render_to_cache_vary',
+                      kwargs={'header': 'Cookie'})
+        self.assertEqual(self.client.get(url, HTTP_X_COLOR='red').content,
+                         'red')
+        self.assertEqual(self.client.get(url, HTTP_X_COLOR='blue').content,
+                         'blue')
+
+    def test_render_to_etag(self):
+        url = reverse('decorators_render_to_with_etag')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'It works!', count=2)
+
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, '')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_render_to_lazy_context(self):
+        old_processors = settings.TEMPLATE_CONTEXT_PROCESSORS
+        set_context_processors(TEST_CONTEXT_PROCESSORS)
+        del CONTEXT_CALLS[:]
+
+        try:
+            url = reverse('decorators_render_to_with_lazy_context')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, 'It works! %s\n' % url)
+            self.assertEqual(CONTEXT_CALLS, [])
+
+            response = self.client.get(reverse('decorators_render_to'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(CONTEXT_CALLS, ['counted', 'unknown'])
+
+            del CONTEXT_CALLS[:]
+            settings.LAZY_CONTEXT = True
+
+            try:
+                response = self.client.get(reverse('decorators_render_to'))
+            finally:
+                del settings.LAZY_CONTEXT
+
+            self.assertContains(response, 'It works!')
+            self.assertEqual(CONTEXT_CALLS, [])
+        finally:
+            set_context_processors(old_processors)
+
+    def test_render_to_timing(self):
+        url = reverse('decorators_render_to_with_timing')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(re.match(r'^view;dur=[\d.]+, context;dur=[\d.]+, '
+                                 r'render;dur=[\d.]+$',
+                                 response['Server-Timing']))
+
+        url = reverse('decorators_render_to')
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+        del METRICS[:]
+        settings.METRICS_SINK = 'testproject.core.tests.collect_metrics'
+
+        try:
+            self.client.get(url)
+            self.client.get(reverse('decorators_render_to_json_timing'))
+        finally:
+            del settings.METRICS_SINK
+
+        self.assertEqual(METRICS,
+            [('testproject.core.views.decorators_render_to',
+              ['context', 'render', 'view']),
+             ('testproject.core.views.decorators_render_to_json_timing',
+              ['encode', 'view'])])
+
     def test_render_to_json(self):
         url = reverse('decorators_render_to_json')
         response = self.client.get(url)
@@ -141,6 +606,216 @@ class TestDecorators(TestCase):
         self.assertEqual(response['Content-Type'], 'application/json')
         self.assertContains(response, '    "key": "value"')
 
+    def test_render_to_json_cache(self):
+        Order.calls = []
+        cache.clear()
+
+        def get(url, data=None):
+            response = self.client.get(url, data or {})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            return simplejson.loads(response.content)
+
+        url = reverse('decorators_render_to_json_cache')
+        self.assertEqual(get(url), {'orders': 0, 'page': None, 'pk': None})
+
+        Order.objects.create(price=10)
+        self.assertEqual(get(url), {'orders': 0, 'page': None, 'pk': None})
+        self.assertEqual(get(url, {'other': 1})['orders'], 0)
+        self.assertEqual(len(Order.calls), 1)
+
+        # Selected GET params and view arguments change cache key
+        self.assertEqual(get(url, {'page': 2}),
+                         {'orders': 1, 'page': '2', 'pk': None})
+        self.assertEqual(get(reverse('decorators_render_to_json_cache',
+                                     kwargs={'pk': 1}))['pk'], '1')
+        self.assertEqual(len(Order.calls), 3)
+
+        invalidate_cached_responses('orders')
+        self.assertEqual(get(url)['orders'], 1)
+        self.assertEqual(get(url)['orders'], 1)
+        self.assertEqual(len(Order.calls), 4)
+
+    def test_render_to_json_cache_user(self):
+        cache.clear()
+
+        clients = []
+
+        for username in ('alice', 'bob'):
+            User.objects.create_user(username, '%s@example.com' % username,
+                                     'password')
+            client = Client()
+            self.assertTrue(client.login(username=username,
+                                         password='password'))
+            clients.append((username, client))
+
+        # Responses, which use session or user, are never shared
+        for name in ('decorators_render_to_json_cache_user',
+                     'decorators_render_to_json_cache_vary_user'):
+            for username, client in clients * 2:
+                response = client.get(reverse(name))
+                self.assertEqual(simplejson.loads(response.content),
+                                 {'user': username})
+                self.assertEqual(response['Vary'], 'Accept, Cookie')
+
+        # Session accessed only for ``'user'`` vary doesn't disable caching
+        Order.calls = []
+        url = reverse('decorators_render_to_json_cache')
+
+        for username, client in clients * 2:
+            self.assertEqual(simplejson.loads(client.get(url).content)['pk'],
+                             None)
+
+        self.assertEqual(Order.calls, ['view'])
+
+    def test_render_to_json_etag(self):
+        Order.calls = []
+
+        url = reverse('decorators_render_to_json_etag_version')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"0"')
+        self.assertEqual(Order.calls, ['view'])
+
+        # View isn't called, when version is matched
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"0"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(Order.calls, ['view'])
+
+        Order.objects.create(price=10)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(simplejson.loads(response.content), {'orders': 1})
+        self.assertEqual(Order.calls, ['view', 'view'])
+
+    def test_render_to_json_msgpack(self):
+        url = reverse('decorators_render_to_json_with_options')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(response['Vary'], 'Accept')
+        self.assertEqual(msgpacklib.unpackb(response.content),
+                         {'key': 'value'})
+
+        # Cached JSON responses are not sent to MessagePack clients
+        cache.clear()
+        url = reverse('decorators_render_to_json_cache')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        response = self.client.get(url, HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpacklib.unpackb(response.content)['orders'], 0)
+
+        # Streamed responses are always JSON
+        url = reverse('decorators_render_to_json_generator')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        # Qualities of media ranges are respected
+        url = reverse('decorators_render_to_json_with_options')
+
+        for accept, content_type in (
+            ('application/msgpack;q=0, application/json', 'application/json'),
+            ('application/msgpack;q=0', 'application/json'),
+            ('application/msgpack;q=0.5, */*', 'application/json'),
+            ('application/json;q=0.5, application/msgpack',
+             'application/msgpack'),
+            ('text/html, application/x-msgpack; q=0.9, */*; q=0.8',
+             'application/msgpack'),
+        ):
+            response = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(response['Content-Type'], content_type, accept)
+
+        # JSON and MessagePack responses have different versions
+        url = reverse('decorators_render_to_json_etag_version')
+        json_etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        msgpack_etag = response['ETag']
+        self.assertNotEqual(json_etag, msgpack_etag)
+
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack',
+                                   HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack',
+                                   HTTP_IF_NONE_MATCH=msgpack_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_render_to_json_stream(self):
+        url = reverse('decorators_render_to_json_generator')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(simplejson.loads(response.content),
+                         [{'number': 0}, {'number': 1}, {'number': 2}])
+
+        Order.objects.create(price=10, quantity=2)
+        Order.objects.create(price=5)
+
+        url = reverse('decorators_render_to_json_ndjson')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response.content,
+                         '{"price": 10, "quantity": 2}\n'
+                         '{"price": 5, "quantity": 1}\n')
+
+        url = reverse('decorators_render_to_json_stream')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(simplejson.loads(response.content), {'key': 'value'})
+
+    def test_shared_memoized(self):
+        calls = []
+
+        @shared_memoized(timeout=60)
+        def domain(site, suffix=''):
+            calls.append(site.pk)
+            return site.domain + suffix
+
+        domain.cache.clear()
+        site = Site.objects.get_current()
+        self.assertEqual(domain(site), site.domain)
+
+        # Value is shared by cache, so other instance of same object hits it
+        self.assertEqual(domain(Site.objects.get(pk=site.pk)), site.domain)
+        self.assertEqual(domain(site, suffix='/'), site.domain + '/')
+        self.assertEqual(calls, [site.pk, site.pk])
+
+        domain.invalidate(site)
+        self.assertEqual(domain(site), site.domain)
+        self.assertEqual(domain(site, suffix='/'), site.domain + '/')
+        self.assertEqual(len(calls), 3)
+
+        domain.invalidate_all()
+        self.assertEqual(domain(site), site.domain)
+        self.assertEqual(domain(site, suffix='/'), site.domain + '/')
+        self.assertEqual(len(calls), 5)
+
+        # Values cached before evicting generation key are never used
+        domain.cache.delete(domain.make_prefix() + ':generation')
+        time.sleep(0.002)
+        self.assertEqual(domain(site), site.domain)
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(domain(site), site.domain)
+        self.assertEqual(len(calls), 6)
+
+        # Other caller computes value, so stale value is returned meanwhile
+        key = domain.make_key((site, ), {})
+        value, delta, expires = domain.cache.get(key)
+        domain.cache.set(key, ('stale', delta, time.time() - 1))
+        domain.cache.add(key + ':lock', 1)
+
+        self.assertEqual(domain(site), 'stale')
+        self.assertEqual(len(calls), 6)
+
+        domain.cache.delete(key + ':lock')
+        self.assertEqual(domain(site), site.domain)
+        self.assertEqual(len(calls), 7)
+
     def test_smart_datetime(self):
         self.assertEqual(self.today(), TODAY)
 
@@ -157,6 +832,100 @@ class TestDecorators(TestCase):
         self.assertEqual(self.yesterday_time_with_datetime_format(),
                          date(NOW - DAY, TEST_DATETIME_FORMAT))
 
+    def test_smart_datetime_today(self):
+        original = decorators.TODAY
+        decorators.TODAY = lambda: TODAY + DAY
+        decorators.TODAY_CACHE[:] = [None, 0]
+
+        # Today is checked on each call, not on decorating
+        try:
+            self.assertEqual(self.now(), date(NOW, DATETIME_FORMAT))
+        finally:
+            decorators.TODAY = original
+            decorators.TODAY_CACHE[:] = [None, 0]
+
+        self.assertEqual(self.now(), date(NOW, TIME_FORMAT))
+
+    def test_smart_datetimes(self):
+        values = [NOW, NOW - DAY, None]
+        self.assertEqual(smart_datetimes(values),
+                         [date(NOW, TIME_FORMAT),
+                          date(NOW - DAY, DATETIME_FORMAT),
+                          None])
+        self.assertEqual(smart_datetimes(values[:2],
+                                         datetime_format=TEST_DATETIME_FORMAT,
+                                         compare_date=YESTERDAY),
+                         [date(NOW, TEST_DATETIME_FORMAT),
+                          date(NOW - DAY, TIME_FORMAT)])
+
+        site = Site.objects.get_current()
+        site.updated = NOW
+        self.assertEqual(smart_datetimes([site], attr='updated',
+                                         time_format=r'\a\t G:i'),
+                         [date(NOW, r'\a\t G:i')])
+
+
+class TestViews(TestCase):
+
+    def test_json_batch(self):
+        Order.calls = []
+        Order.objects.create(price=10)
+
+        cache_url = reverse('decorators_render_to_json_cache',
+                            kwargs={'pk': 5})
+        requests = [reverse('decorators_render_to_json_with_options'),
+                    {'path': cache_url, 'params': {'page': 3}},
+                    reverse('decorators_render_to_json_generator'),
+                    reverse('decorators_render_to_json_login_required'),
+                    reverse('decorators_render_to'),
+                    '/does-not-exist/',
+                    reverse('json_batch'),
+                    {'path': cache_url, 'params': [1]},
+                    reverse('decorators_render_to_json_error')]
+
+        url = reverse('json_batch')
+        response = self.client.post(url,
+                                    simplejson.dumps(requests),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        data = simplejson.loads(response.content)
+        self.assertEqual(len(data), 9)
+
+        self.assertEqual(data[0], {'data': {'key': 'value'},
+                                   'path': requests[0],
+                                   'status': 200})
+        self.assertEqual(data[1]['data'],
+                         {'orders': 1, 'page': '3', 'pk': '5'})
+        self.assertEqual(data[2]['data'],
+                         [{'number': 0}, {'number': 1}, {'number': 2}])
+
+        # Views decorated after ``render_to_json`` are called with all
+        # decorators
+        self.assertEqual(data[3]['status'], 302)
+        self.assertTrue('error' in data[3])
+
+        # Views, which aren't decorated by ``render_to_json``, and batch view
+        # itself are never called
+        self.assertEqual(data[4]['status'], 400)
+        self.assertTrue('error' in data[4])
+        self.assertEqual(data[6]['status'], 400)
+        self.assertTrue('error' in data[6])
+
+        # Errors are reported for each request
+        self.assertEqual(data[5]['status'], 404)
+        self.assertEqual(data[7]['status'], 400)
+        self.assertEqual(data[8], {'error': 'Internal server error.',
+                                   'path': requests[8],
+                                   'status': 500})
+
+        # Views are called without ``render_to_json`` options, e.g. cache
+        self.assertEqual(Order.calls, ['view'])
+
+        response = self.client.post(url, '{}',
+                                    content_type='application/json')
+        self.assertTrue('error' in simplejson.loads(response.content))
+
 
 class TestSitemaps(TestCase):
 
@@ -13,17 +13,67 @@ urlpatterns = patterns('testproject.core.views',
         name='context_processors_path'),
     url(r'^decorators/render-to/$', 'decorators_render_to',
         name='decorators_render_to'),
+    url(r'^decorators/render-to/cache/csrf/$',
+        'decorators_render_to_cache_csrf',
+        name='decorators_render_to_cache_csrf'),
+    url(r'^decorators/render-to/cache/vary/(?P<header>[\w-]+)/$',
+        'decorators_render_to_cache_vary',
+        name='decorators_render_to_cache_vary'),
+    url(r'^decorators/render-to/etag/$', 'decorators_render_to_with_etag',
+        name='decorators_render_to_with_etag'),
     url(r'^decorators/render-to/mimetype/$',
         'decorators_render_to_with_mimetype',
         name='decorators_render_to_with_mimetype'),
     url(r'^decorators/render-to/mimetype-in-dict/$',
         'decorators_render_to_with_mimetype_in_dict',
         name='decorators_render_to_with_mimetype_in_dict'),
+    url(r'^decorators/render-to/lazy-context/$',
+        'decorators_render_to_with_lazy_context',
+        name='decorators_render_to_with_lazy_context'),
+    url(r'^decorators/render-to/timing/$', 'decorators_render_to_with_timing',
+        name='decorators_render_to_with_timing'),
     url(r'^decorators/render-to-json/$', 'decorators_render_to_json',
         name='decorators_render_to_json'),
     url(r'^decorators/render-to-json/options/$',
         'decorators_render_to_json_with_options',
         name='decorators_render_to_json_with_options'),
+    url(r'^decorators/render-to-json/cache/$',
+        'decorators_render_to_json_cache',
+        name='decorators_render_to_json_cache'),
+    url(r'^decorators/render-to-json/cache/(?P<pk>\d+)/$',
+        'decorators_render_to_json_cache',
+        name='decorators_render_to_json_cache'),
+    url(r'^decorators/render-to-json/cache/user/$',
+        'decorators_render_to_json_cache_user',
+        name='decorators_render_to_json_cache_user'),
+    url(r'^decorators/render-to-json/cache/vary-user/$',
+        'decorators_render_to_json_cache_vary_user',
+        name='decorators_render_to_json_cache_vary_user'),
+    url(r'^decorators/render-to-json/error/$',
+        'decorators_render_to_json_error',
+        name='decorators_render_to_json_error'),
+    url(r'^decorators/render-to-json/etag/$',
+        'decorators_render_to_json_etag_version',
+        name='decorators_render_to_json_etag_version'),
+    url(r'^decorators/render-to-json/generator/$',
+        'decorators_render_to_json_generator',
+        name='decorators_render_to_json_generator'),
+    url(r'^decorators/render-to-json/ndjson/$',
+        'decorators_render_to_json_ndjson',
+        name='decorators_render_to_json_ndjson'),
+    url(r'^decorators/render-to-json/timing/$',
+        'decorators_render_to_json_timing',
+        name='decorators_render_to_json_timing'),
+    url(r'^decorators/render-to-json/login-required/$',
+        'decorators_render_to_json_login_required',
+        name='decorators_render_to_json_login_required'),
+    url(r'^decorators/render-to-json/stream/$',
+        'decorators_render_to_json_stream',
+        name='decorators_render_to_json_stream'),
+)
+
+urlpatterns += patterns('kikola.core.views',
+    url(r'^json-batch/$', 'json_batch', name='json_batch'),
 )
 
 urlpatterns += patterns('django.contrib.sitemaps.views',
@@ -1,6 +1,11 @@
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+
 from kikola.core.context_processors import path
 from kikola.core.decorators import render_to, render_to_json
 
+from testproject.core.models import Order
+
 
 @render_to_json
 def context_processors_path(request):
@@ -12,6 +17,34 @@ def decorators_render_to(request):
     return {'text': 'It works!'}
 
 
+@render_to('core/render_to.html', cache=60)
+def decorators_render_to_cache_vary(request, header):
+    response = HttpResponse(request.META.get('HTTP_X_COLOR', ''))
+    response['Vary'] = header
+    return response
+
+
+@render_to('core/render_to_csrf.html', cache=60)
+def decorators_render_to_cache_csrf(request):
+    return {}
+
+
+@render_to('core/render_to.html', etag=True)
+def decorators_render_to_with_etag(request):
+    return {'text': 'It works!'}
+
+
+@render_to('core/render_to.html', timing=True)
+def decorators_render_to_with_timing(request):
+    return {'text': 'It works!'}
+
+
+@render_to('core/render_to_lazy_context.txt', mimetype='text/plain',
+           lazy_context=True)
+def decorators_render_to_with_lazy_context(request):
+    return {'text': 'It works!'}
+
+
 @render_to('core/render_to.txt', mimetype='text/plain')
 def decorators_render_to_with_mimetype(request):
     return {'text': 'It works!'}
@@ -32,3 +65,61 @@ def decorators_render_to_json(request):
 @render_to_json(indent=4)
 def decorators_render_to_json_with_options(request):
     return {'key': 'value'}
+
+
+@render_to_json(cache={'params': ('page', ),
+                       'tags': ('orders', ),
+                       'timeout': 60,
+                       'vary': ('user', )})
+def decorators_render_to_json_cache(request, pk=None):
+    Order.calls.append('view')
+    return {'orders': Order.objects.count(),
+            'page': request.GET.get('page'),
+            'pk': pk}
+
+
+@render_to_json
+def decorators_render_to_json_error(request):
+    raise ValueError('Error in view.')
+
+
+@render_to_json(cache=60)
+def decorators_render_to_json_cache_user(request):
+    return {'user': request.user.username}
+
+
+@render_to_json(cache={'vary': ('user', )})
+def decorators_render_to_json_cache_vary_user(request):
+    return {'user': request.user.username}
+
+
+@render_to_json(etag=lambda request: Order.objects.count())
+def decorators_render_to_json_etag_version(request):
+    Order.calls.append('view')
+    return {'orders': Order.objects.count()}
+
+
+@render_to_json
+def decorators_render_to_json_generator(request):
+    return (dict(number=i) for i in range(3))
+
+
+@render_to_json(ndjson=True)
+def decorators_render_to_json_ndjson(request):
+    return Order.objects.order_by('pk').values('price', 'quantity')
+
+
+@render_to_json(timing=True)
+def decorators_render_to_json_timing(request):
+    return {'key': 'value'}
+
+
+@login_required
+@render_to_json
+def decorators_render_to_json_login_required(request):
+    return {'user': request.user.username}
+
+
+@render_to_json(stream=True)
+def decorators_render_to_json_stream(request):
+    return {'key': 'value'}
@@ -35,9 +35,11 @@ INSTALLED_APPS = [
 
     'django_extensions',
     'kikola',
+    'kikola.contrib.basicsearch',
     'south',
 
     'testproject.base',
+    'testproject.contrib',
     'testproject.core',
     'testproject.db',
     'testproject.templatetags',
@@ -94,6 +96,16 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.messages.middleware.MessageMiddleware',
 ]
 
+# Search settings
+SEARCH_MODELS = {
+    'contrib.Article': {
+        'description': '{{ obj.content|truncatewords:5 }}',
+        'fields': ('title', 'content'),
+        'title': '{{ obj.title }}',
+        'trigger': lambda obj: obj.is_published,
+    },
+}
+
 # Session settings
 SESSION_COOKIE_NAME = 'testproject_sid'
 
@@ -1,6 +1,13 @@
 from settings import *
 
 
+# Databases settings
+if VERSION[0] == 1 and VERSION[1] >= 2:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': rel('testproject_replica.db'),
+    }
+
 # Debug settins
 DEBUG = True
 TEMPLATE_DEBUG = DEBUG
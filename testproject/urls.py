@@ -18,5 +18,6 @@ else:
 
 urlpatterns += patterns('',
     (r'^core/', include('testproject.core.urls')),
+    (r'^search/', include('kikola.contrib.basicsearch.urls')),
     (r'^utils/', include('testproject.utils.urls')),
 )
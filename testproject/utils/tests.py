@@ -1,10 +1,13 @@
 import datetime
+import decimal
+import uuid
 
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.utils.encoding import smart_str
 
 from kikola.utils import *
+from kikola.utils import jsonlib, msgpacklib
 
 
 NOW = datetime.datetime.now()
@@ -43,6 +46,64 @@ class TestDigits(TestCase):
         self.assertEqual(force_int('data', 1), 1)
 
 
+class TestJSONLib(TestCase):
+
+    def test_dumps(self):
+        value = uuid.UUID('12345678123456781234567812345678')
+        data = {'date': datetime.date(2011, 5, 9),
+                'datetime': datetime.datetime(2011, 5, 9, 12, 30),
+                'decimal': decimal.Decimal('1.50'),
+                'time': datetime.time(12, 30, 15),
+                'timedelta': datetime.timedelta(minutes=1, microseconds=500000),
+                'uuid': value}
+
+        self.assertEqual(jsonlib.loads(jsonlib.dumps(data)),
+                         {'date': '2011-05-09',
+                          'datetime': '2011-05-09 12:30:00',
+                          'decimal': '1.50',
+                          'time': '12:30:15',
+                          'timedelta': 60.5,
+                          'uuid': str(value)})
+
+        self.assertEqual(jsonlib.dumps([1, 2], separators=(',', ':')),
+                         '[1,2]')
+        self.assertEqual(
+            jsonlib.dumps(datetime.timedelta(hours=1, minutes=30),
+                          cls=TimedeltaJSONEncoder),
+            '"1:30"'
+        )
+        self.assertRaises(TypeError, jsonlib.dumps, object())
+
+
+class TestMsgpackLib(TestCase):
+
+    def test_packb(self):
+        self.assertEqual(msgpacklib.packb({'a': [1, -1, None, True]}),
+                         '\x81\xa1a\x94\x01\xff\xc0\xc3')
+
+        values = [None, False, 0, 127, 128, 65536, 2 ** 40, -33, -2 ** 40,
+                  1.5, u'', u'\u043a' * 40, 'x' * 300, range(20),
+                  dict([(unicode(i), i) for i in range(20)])]
+
+        for value in values:
+            self.assertEqual(msgpacklib.unpackb(msgpacklib.packb(value)),
+                             value)
+
+        encoder = jsonlib.JSONEncoder()
+        value = msgpacklib.packb(datetime.date(2011, 5, 9),
+                                 default=encoder.default)
+        self.assertEqual(msgpacklib.unpackb(value), u'2011-05-09')
+
+        self.assertRaises(TypeError, msgpacklib.packb, object())
+
+        # UTF-8 byte strings are packed as strings by any backend
+        self.assertEqual(msgpacklib.normalize({'a': ('b', '\xff', 1)}),
+                         {u'a': [u'b', '\xff', 1]})
+        self.assertEqual(msgpacklib.packb(['\xd0\xba', '\xff']),
+                         '\x92\xa2\xd0\xba\xc4\x01\xff')
+        self.assertRaises(ValueError, msgpacklib.unpackb, '\x92\x01')
+
+
 class TestTimedelta(TestCase):
 
     def setUp(self):